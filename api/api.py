@@ -5,32 +5,50 @@ Provides REST endpoints, webhooks, and automation features.
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Depends, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from typing import List, Optional, Dict, Any, Union
-import json
+from pydantic import ValidationError
+from typing import Awaitable, Callable, List, Optional, Dict, Any, Union, Literal
+import hashlib
+import httpx
+import operator
 import os
-from datetime import datetime, date
+import orjson
+import random
+import re
+import uuid
+from datetime import datetime, date, timezone
 import uvicorn
 import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from api.config import (
     ENVIRONMENT, ALLOWED_ORIGINS, API_KEY, REQUIRE_API_KEY,
-    API_KEY_HEADER, RATE_LIMIT_ENABLED, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW
+    API_KEY_HEADER, RATE_LIMIT_ENABLED, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW,
+    SEARCH_MAX_WORKERS, SEARCH_MAX_PENDING, SEARCH_CACHE_TTL, SEARCH_NEGATIVE_CACHE_TTL,
+    API_HOST, API_PORT, WORKERS, ACCESS_LOG,
+    SEARCH_HISTORY_RETENTION_DAYS, SEARCH_HISTORY_PRUNE_INTERVAL,
+    LOG_EXCEPTION_SAMPLE_RATE, AI_MAX_CONCURRENCY, AI_MAX_RETRIES, AI_REQUEST_TIMEOUT,
+    AI_PROMPT_EXAMPLES, AI_QUERY_CACHE_TTL
 )
 from api.middleware import APIKeyMiddleware, RateLimitMiddleware, SecurityHeadersMiddleware
-from api.database import init_db, get_db, SearchHistory
+from api.database import init_db, get_db, SessionLocal, prune_search_history
 from api.models import (
-    FlightResult, SearchResponse, ErrorResponse, FlightSegment,
+    SearchResponse, ErrorResponse, FlightSegment,
     FlightSearchRequest, WebhookPayload, PriceAlertRequest,
-    PriceAlertResponse, NaturalLanguageQuery
+    PriceAlertResponse, NaturalLanguageQuery, ParsedFlightQuery
 )
 from api.services import (
     parse_flexible_date, convert_city_to_airport,
-    get_flights_url, send_webhook_notification
+    get_flights_url, fan_out_webhooks, get_http_client, close_http_client
 )
 from api.logger import setup_logging, logger
-from api.cache import get_cached, set_cached, generate_cache_key
+from api.cache import get_cached, set_cached, generate_cache_key, close_redis_client
 from api.validators import (
     validate_airport_code, validate_date_not_past, validate_date_range,
     validate_date_reasonable_future, validate_email, validate_origin_destination,
@@ -44,32 +62,31 @@ load_dotenv()
 # Configure structured logging
 setup_logging()
 
-# Optional AI functionality
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    openai = None
+# Optional AI functionality, imported on first use so workers that never
+# serve /ai/search don't pay the SDK import cost at startup
+@lru_cache(maxsize=None)
+def _load_openai():
+    try:
+        import openai
+        return openai
+    except ImportError:
+        return None
 
-try:
-    import google.generativeai as genai
-    GOOGLE_AI_AVAILABLE = True
-except ImportError:
-    GOOGLE_AI_AVAILABLE = False
-    genai = None
 
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-except ImportError:
-    REQUESTS_AVAILABLE = False
+@lru_cache(maxsize=None)
+def _load_generativelanguage():
+    # The low-level Gemini client installed with google-generativeai; unlike
+    # genai.configure(), its clients each carry their own API key
+    try:
+        from google.ai import generativelanguage
+        return generativelanguage
+    except ImportError:
+        return None
 
 # Import our flight search functionality
 try:
     from flights.fast_flights.core import get_flights
     from flights.fast_flights.flights_impl import FlightData, Passengers
-    from typing import Optional, Literal
 
     # Define FlightSearchError for compatibility
     class FlightSearchError(Exception):
@@ -90,6 +107,14 @@ except ImportError as e:
     def get_flights(*args, **kwargs):
         raise FlightSearchError("Flight search not available")
 
+
+@dataclass(slots=True)
+class FlightSearchResult:
+    """Scraper output for a single search, as returned by search_flights"""
+    flights: list = field(default_factory=list)
+    current_price: str = "unknown"
+
+
 def search_flights(
     origin: str,
     destination: str,
@@ -102,7 +127,7 @@ def search_flights(
     seat: Literal["economy", "premium-economy", "business", "first"] = "economy",
     max_stops: Optional[int] = None,
     fetch_mode: Literal["common", "fallback", "force-fallback", "local", "bright-data"] = "local"
-):
+) -> FlightSearchResult:
     """Search for flights using the fast_flights library"""
     try:
         # Prepare flight data
@@ -144,19 +169,153 @@ def search_flights(
 
         # Convert result to expected format
         if result and hasattr(result, 'flights'):
-            return type('Result', (), {
-                'flights': result.flights,
-                'current_price': getattr(result, 'current_price', 'unknown')
-            })()
+            return FlightSearchResult(
+                flights=result.flights,
+                current_price=getattr(result, 'current_price', 'unknown')
+            )
         else:
-            return type('Result', (), {
-                'flights': [],
-                'current_price': 'unknown'
-            })()
+            return FlightSearchResult()
 
     except Exception as e:
         raise FlightSearchError(f"Flight search failed: {str(e)}")
 
+
+# Flight fields exposed in API responses, fetched in one C-level call per flight
+# Output fields and the value used when a flight object lacks one
+_FLIGHT_DEFAULTS = {
+    'name': 'Unknown', 'departure': '', 'arrival': '', 'duration': '',
+    'stops': 0, 'price': '', 'delay': None
+}
+_FLIGHT_FIELDS = tuple(_FLIGHT_DEFAULTS)
+_get_flight_fields = operator.attrgetter(*_FLIGHT_FIELDS)
+
+
+def _format_flight(flight) -> Dict[str, Any]:
+    try:
+        return dict(zip(_FLIGHT_FIELDS, _get_flight_fields(flight)))
+    except AttributeError:
+        # fast_flights versions differ in which fields Flight has; degrade, don't fail the search
+        return {name: getattr(flight, name, default) for name, default in _FLIGHT_DEFAULTS.items()}
+
+
+def format_flights(flights) -> List[Dict[str, Any]]:
+    """Convert scraper flight objects into JSON-serializable dicts."""
+    return [_format_flight(flight) for flight in flights]
+
+
+def normalize_search_params(search_params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonicalize search parameters before they are hashed into a cache key.
+
+    Flexible dates ("weekend", "+3 days") resolve to ISO dates so a key always
+    means one concrete search, airport codes are upper-cased and passenger
+    counts are clamped to the ranges the scraper accepts.
+    """
+    params = dict(search_params)
+    for key in ("origin", "destination"):
+        if params.get(key):
+            params[key] = params[key].strip().upper()
+    for key in ("depart_date", "return_date"):
+        if params.get(key):
+            params[key] = parse_flexible_date(params[key]).isoformat()
+    params["adults"] = max(1, min(params.get("adults", 1), 9))
+    params["children"] = max(0, min(params.get("children", 0), 8))
+    params["infants_in_seat"] = max(0, min(params.get("infants_in_seat", 0), 4))
+    params["infants_on_lap"] = max(0, min(params.get("infants_on_lap", 0), 4))
+    return params
+
+
+# Blocking scrapes get their own pool so a burst of searches can't starve
+# other asyncio.to_thread users of the default executor
+_search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="search")
+_search_slots = asyncio.Semaphore(SEARCH_MAX_PENDING)
+
+
+# Scrapes currently running, by cache key; concurrent identical searches
+# await the same task instead of scraping again
+_inflight_searches: Dict[str, asyncio.Task] = {}
+
+
+def _forget_inflight_search(cache_key: str, task: asyncio.Task) -> None:
+    """Done-callback: drop a finished scrape from the in-flight map."""
+    if _inflight_searches.get(cache_key) is task:
+        del _inflight_searches[cache_key]
+    # Retrieve the error so a scrape whose callers all left doesn't log "never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+async def cached_search(search_params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run search_flights behind the Redis cache.
+
+    search_params are normalized first so equivalent searches share one
+    cache entry. Returns a JSON-serializable dict with ``current_price``
+    and formatted ``flights``. Empty results and scraper failures are
+    cached for SEARCH_NEGATIVE_CACHE_TTL; a cached failure re-raises
+    FlightSearchError without scraping again. Identical searches that
+    arrive while one is scraping share its result (or error). Raises a
+    503 HTTPException when SEARCH_MAX_PENDING scrapes are already running
+    or queued.
+    """
+    search_params = normalize_search_params(search_params)
+    use_cache = search_params.get("fetch_mode") != "force-fallback"
+    cache_key = generate_cache_key("flight_search", **search_params)
+
+    if not use_cache:
+        return await _scrape(search_params, cache_key, use_cache)
+
+    cached_result = await get_cached(cache_key)
+    if cached_result:
+        logger.info(f"Cache hit for search: {cache_key}")
+        if cached_result.get("degraded"):
+            # The scraper failed for this exact search moments ago; don't retry it yet
+            raise FlightSearchError(cached_result["error"])
+        return cached_result
+
+    task = _inflight_searches.get(cache_key)
+    if task is not None:
+        logger.info(f"Joining in-flight search: {cache_key}")
+    else:
+        # The scrape runs as its own task, owned by no single request
+        task = asyncio.ensure_future(_scrape(search_params, cache_key, use_cache))
+        _inflight_searches[cache_key] = task
+        task.add_done_callback(partial(_forget_inflight_search, cache_key))
+
+    # Shielded so a disconnecting caller (the first one included) doesn't
+    # cancel the scrape the others are waiting on
+    return await asyncio.shield(task)
+
+
+async def _scrape(search_params: Dict[str, Any], cache_key: str, use_cache: bool) -> Dict[str, Any]:
+    """Run one scrape on the search pool and cache its outcome."""
+    # Fail fast rather than queue behind a saturated scrape pool
+    if _search_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many searches in progress, try again shortly")
+
+    try:
+        async with _search_slots:
+            result = await asyncio.get_running_loop().run_in_executor(
+                _search_executor, partial(search_flights, **search_params)
+            )
+    except FlightSearchError as e:
+        if use_cache:
+            await set_cached(
+                cache_key, {"degraded": True, "error": str(e)}, ttl=SEARCH_NEGATIVE_CACHE_TTL
+            )
+        raise
+
+    search_data = {
+        "current_price": result.current_price,
+        "flights": format_flights(result.flights)
+    }
+
+    if use_cache:
+        ttl = SEARCH_CACHE_TTL if search_data["flights"] else SEARCH_NEGATIVE_CACHE_TTL
+        await set_cached(cache_key, search_data, ttl=ttl)
+
+    return search_data
+
 # Note: get_flights_url is now in api.services
 # Import city mapping and utilities from separate modules  
 from api.constants import CITY_TO_AIRPORT
@@ -165,6 +324,7 @@ app = FastAPI(
     title="🧠 FlyMind API",
     description="AI-Powered Flight Analytics & Automation Suite - Intelligent flight search, real-time Google Flights scraping, and automation tools for developers and enterprises",
     version="2.0.0",
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_tags=[
@@ -202,28 +362,30 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Explicit lists let Starlette answer preflights with plain lookups
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type", API_KEY_HEADER],
 )
 
 # Database imports for persistent storage
 from api.database import (
-    create_search_history, get_search_history,
+    persist_search_history, get_search_history,
     create_price_alert as db_create_price_alert, get_price_alert, get_all_active_alerts,
-    create_webhook, get_webhook, get_all_webhooks
+    create_webhook, get_webhook, get_active_webhook_urls, persist_webhook_usage,
+    get_active_webhooks_cached, invalidate_webhook_cache
 )
 
 # Global exception handlers for consistent error responses
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions with consistent format"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
             "error": exc.detail,
             "error_code": f"HTTP_{exc.status_code}",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "path": str(request.url)
         }
     )
@@ -231,39 +393,52 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors with detailed information"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={
             "success": False,
             "error": "Request validation failed",
             "error_code": "VALIDATION_ERROR",
-            "details": exc.errors(),
-            "timestamp": datetime.now().isoformat(),
+            # errors() may carry exception objects or raw bytes in ctx/input
+            "details": jsonable_encoder(exc.errors()),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "path": str(request.url)
         }
     )
 
+# Occurrences per (exception type, message prefix), used to sample tracebacks
+_exception_counts: Dict[tuple, int] = {}
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Handle all other exceptions with consistent format"""
+    exception_message = str(exc)
+    signature = (type(exc).__name__, exception_message[:80])
+    if signature not in _exception_counts and len(_exception_counts) >= 1000:
+        _exception_counts.clear()
+    occurrences = _exception_counts.get(signature, 0) + 1
+    _exception_counts[signature] = occurrences
+
+    # Full traceback on the first occurrence and then 1 in N; compact line otherwise
     logger.error(
         "Unhandled exception",
         extra={
-            "exception_type": type(exc).__name__,
-            "exception_message": str(exc),
+            "exception_type": signature[0],
+            "exception_message": exception_message,
+            "occurrences": occurrences,
             "path": str(request.url),
             "method": request.method,
             "client_ip": request.client.host if request.client else None,
         },
-        exc_info=True
+        exc_info=LOG_EXCEPTION_SAMPLE_RATE <= 1 or occurrences % LOG_EXCEPTION_SAMPLE_RATE == 1
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
             "error": "Internal server error",
             "error_code": "INTERNAL_SERVER_ERROR",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "path": str(request.url),
             "message": "An unexpected error occurred. Please try again later."
         }
@@ -282,24 +457,26 @@ async def root():
 @app.get("/health", tags=["System"])
 async def health_check():
     """Health check endpoint for load balancers and monitoring"""
-    return {
+    # A few seconds is enough for a proxy to absorb probe bursts while
+    # still noticing an unhealthy worker quickly
+    return ORJSONResponse({
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "version": "2.0.0"
-    }
+    }, headers={"Cache-Control": "public, max-age=5"})
 
 @app.get("/version", tags=["System"])
 async def get_version():
     """Get API version and deployment information"""
-    return {
+    return ORJSONResponse({
         "version": "2.0.0",
         "name": "Google Flights API",
         "description": "World-class Google Flights scraper API for automation",
         "environment": os.getenv("ENVIRONMENT", "development"),
-        "timestamp": datetime.now().isoformat()
-    }
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }, headers={"Cache-Control": "public, max-age=60"})
 
-@app.post("/search", tags=["Flights"])
+@app.post("/search", response_model=SearchResponse, tags=["Flights"])
 async def search_flights_endpoint(
     request: FlightSearchRequest,
     background_tasks: BackgroundTasks,
@@ -311,6 +488,9 @@ async def search_flights_endpoint(
     This endpoint is optimized for n8n HTTP Request nodes and returns
     structured JSON responses that work well with n8n workflows.
     """
+    # Read the clock once and reuse it for logs, webhooks and response timestamps
+    now_iso = datetime.now(timezone.utc).isoformat()
+
     try:
         # Sanitize and validate inputs
         if hasattr(request, 'origin') and request.origin:
@@ -345,6 +525,7 @@ async def search_flights_endpoint(
             # This is a simplified approach - in production, you'd want to search all segments together
             all_flights = []
             combined_price = 0
+            segment_searches = []
             
             for i, segment in enumerate(segments):
                 # Validate each segment
@@ -367,7 +548,7 @@ async def search_flights_endpoint(
                 if not validate_airport_code(dest_code):
                     raise HTTPException(status_code=400, detail=f"Invalid destination airport code in segment {i+1}: {segment.destination}")
                 
-                # Search this segment
+                # Queue this segment's search
                 segment_params = {
                     "origin": origin_code,
                     "destination": dest_code,
@@ -381,21 +562,24 @@ async def search_flights_endpoint(
                     "max_stops": request.max_stops,
                     "fetch_mode": request.fetch_mode
                 }
-                
-                segment_result = await asyncio.to_thread(search_flights, **segment_params)
-                
-                if segment_result and hasattr(segment_result, 'flights') and segment_result.flights:
-                    # Add segment info to flights
-                    for flight in segment_result.flights[:5]:  # Limit to top 5 per segment
-                        flight.segment_index = i
-                        flight.segment_route = f"{origin_code} → {dest_code}"
-                        all_flights.append(flight)
-            
-            # Create combined result
-            result = type('Result', (), {
-                'flights': all_flights,
-                'current_price': 'multi-city'
-            })()
+                segment_searches.append((f"{origin_code} → {dest_code}", segment_params))
+
+            # Segments are independent, so scrape them concurrently (bounded by the search executor)
+            segment_results = await asyncio.gather(
+                *(cached_search(params) for _, params in segment_searches), return_exceptions=True
+            )
+
+            for i, ((route, _), segment_result) in enumerate(zip(segment_searches, segment_results)):
+                if isinstance(segment_result, BaseException):
+                    raise segment_result
+
+                # Add segment info to flights
+                for flight in segment_result["flights"][:5]:  # Limit to top 5 per segment
+                    all_flights.append({
+                        **flight,
+                        "segment_index": i,
+                        "segment_route": route
+                    })
             
             # Generate combined search URL
             search_url = f"https://www.google.com/travel/flights?q=flights"
@@ -408,19 +592,11 @@ async def search_flights_endpoint(
             
             # For multi-city, skip the single segment logic below
             # Store search in history
-            search_id = f"search_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{abs(hash(str(request.dict())))}"
+            search_id = f"search_{uuid.uuid4().hex}"
+            logger.info(f"Search {search_id}: multi-city {len(segments)} segments at {now_iso}")
             # Convert request dict to JSON-serializable format
-            request_dict = request.dict()
-            # Convert date objects to strings
-            for key, value in request_dict.items():
-                if isinstance(value, date):
-                    request_dict[key] = value.isoformat()
-                elif isinstance(value, list):
-                    for item in value:
-                        if isinstance(item, dict):
-                            for k, v in item.items():
-                                if isinstance(v, date):
-                                    item[k] = v.isoformat()
+            # JSON mode renders dates (including nested segment dates) as ISO strings
+            request_dict = request.model_dump(mode="json")
             
             # For multi-city, extract origin from first segment and destination from last segment
             if not segments:
@@ -439,55 +615,31 @@ async def search_flights_endpoint(
             
             depart_date_for_db = first_segment.depart_date.isoformat() if isinstance(first_segment.depart_date, date) else str(first_segment.depart_date)
             
-            # Create search history with proper fields for multi-city
-            search_history_data = {
-                "id": search_id,
-                "origin": origin_for_db,
-                "destination": destination_for_db,
-                "depart_date": depart_date_for_db,
-                "return_date": None,
-                "adults": request.adults,
-                "children": request.children,
-                "seat_class": request.seat_class,
-                "fetch_mode": request.fetch_mode,
-                "request_data": request_dict,
-                "result_data": {
-                    "flights": [{'name': getattr(f, 'name', ''), 'departure': getattr(f, 'departure', ''),
-                                'arrival': getattr(f, 'arrival', ''), 'duration': getattr(f, 'duration', ''),
-                                'stops': getattr(f, 'stops', 0), 'price': getattr(f, 'price', ''),
-                                'delay': getattr(f, 'delay', None), 'segment_index': getattr(f, 'segment_index', None),
-                                'segment_route': getattr(f, 'segment_route', None)} for f in all_flights],
-                    "current_price": getattr(result, 'current_price', 'multi-city'),
+            # Store search history after the response is sent
+            background_tasks.add_task(
+                persist_search_history, SessionLocal, search_id, request_dict,
+                {
+                    "flights": all_flights,
+                    "current_price": "multi-city",
                     "total_flights": len(all_flights)
                 },
-                "timestamp": datetime.now()
-            }
-            db_search = SearchHistory(**search_history_data)
-            db.add(db_search)
-            db.commit()
-            db.refresh(db_search)
+                origin=origin_for_db,
+                destination=destination_for_db,
+                depart_date=depart_date_for_db,
+                return_date=None
+            )
             
             # Return response for multi-city
-            response_data = SearchResponse(
-                success=True,
-                current_price=getattr(result, 'current_price', 'multi-city'),
-                total_flights=len(all_flights),
-                flights=[FlightResult(
-                    name=getattr(f, 'name', ''),
-                    departure=getattr(f, 'departure', ''),
-                    arrival=getattr(f, 'arrival', ''),
-                    duration=getattr(f, 'duration', ''),
-                    stops=getattr(f, 'stops', 0),
-                    price=getattr(f, 'price', ''),
-                    delay=getattr(f, 'delay', None),
-                    segment_index=getattr(f, 'segment_index', None),
-                    segment_route=getattr(f, 'segment_route', None)
-                ) for f in all_flights[:20]],
-                search_url=search_url,
-                timestamp=datetime.now().isoformat(),
-                search_id=search_id
-            )
-            return response_data
+            return ORJSONResponse({
+                "success": True,
+                "current_price": "multi-city",
+                "total_flights": len(all_flights),
+                "flights": all_flights[:20],
+                "search_url": search_url,
+                "timestamp": now_iso,
+                "error": None,
+                "search_id": search_id
+            })
         else:
             # Single segment search (original logic)
             segment = segments[0]
@@ -536,27 +688,8 @@ async def search_flights_endpoint(
             "fetch_mode": request.fetch_mode
         }
 
-        # Check cache first (cache for 5 minutes for same searches)
-        cache_key = generate_cache_key("flight_search", **search_params)
-        cached_result = await get_cached(cache_key)
-        
-        if cached_result:
-            logger.info(f"Cache hit for search: {cache_key}")
-            result = type('Result', (), cached_result)()
-        else:
-            # Perform search asynchronously in a thread pool
-            result = await asyncio.to_thread(search_flights, **search_params)
-            
-            # Cache the result (only cache successful searches)
-            if result and hasattr(result, 'flights'):
-                cache_data = {
-                    'flights': [{'name': getattr(f, 'name', ''), 'departure': getattr(f, 'departure', ''),
-                                'arrival': getattr(f, 'arrival', ''), 'duration': getattr(f, 'duration', ''),
-                                'stops': getattr(f, 'stops', 0), 'price': getattr(f, 'price', ''),
-                                'delay': getattr(f, 'delay', None)} for f in result.flights],
-                    'current_price': getattr(result, 'current_price', 'unknown')
-                }
-                await set_cached(cache_key, cache_data, ttl=300)  # 5 minutes
+        # Served from cache when the same normalized search ran recently
+        result = await cached_search(search_params)
 
         # Generate search URL
         search_url = get_flights_url(
@@ -572,67 +705,60 @@ async def search_flights_endpoint(
             max_stops=search_params["max_stops"]
         )
 
-        # Format flights for n8n compatibility
-        formatted_flights = []
-        for flight in result.flights:
-            formatted_flights.append({
-                "name": getattr(flight, 'name', 'Unknown'),
-                "departure": getattr(flight, 'departure', ''),
-                "arrival": getattr(flight, 'arrival', ''),
-                "duration": getattr(flight, 'duration', ''),
-                "stops": getattr(flight, 'stops', 0),
-                "price": getattr(flight, 'price', ''),
-                "delay": getattr(flight, 'delay', None)
-            })
+        # Flights are already formatted for n8n compatibility
+        formatted_flights = result["flights"]
 
-        # Create search ID for tracking
-        # Use origin and destination from the converted codes, not from request (which might be city names)
-        search_id = f"search_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{origin_code}_{dest_code}"
+        # Create search ID for tracking; random so concurrent same-route searches never collide
+        search_id = f"search_{uuid.uuid4().hex}"
+        logger.info(f"Search {search_id}: {origin_code} → {dest_code} at {now_iso}")
 
-        # Store in database
-        request_data = request.dict()
-        # Convert date objects to strings for JSON serialization
-        for key, value in request_data.items():
-            if isinstance(value, date):
-                request_data[key] = value.isoformat()
+        # History record for the database
+        # JSON mode renders dates as ISO strings for the JSON column
+        request_data = request.model_dump(mode="json")
         
         result_data = {
-                "current_price": getattr(result, 'current_price', 'unknown'),
-                "total_flights": len(result.flights),
+                "current_price": result["current_price"],
+                "total_flights": len(formatted_flights),
                 "flights": formatted_flights
         }
-        create_search_history(db, search_id, request_data, result_data)
+        # Store in database after the response is sent
+        background_tasks.add_task(persist_search_history, SessionLocal, search_id, request_data, result_data)
 
         # Send webhooks in background
-        webhooks = get_all_webhooks(db)
+        webhooks = get_active_webhooks_cached(db)
         if webhooks:
             webhook_payload = WebhookPayload(
                 event="flight_search_completed",
                 search_id=search_id,
                 data={
-                    "current_price": getattr(result, 'current_price', 'unknown'),
-                    "total_flights": len(result.flights),
+                    "current_price": result["current_price"],
+                    "total_flights": len(formatted_flights),
                     "flights": formatted_flights[:10]  # Send first 10 flights
                 },
-                timestamp=datetime.now().isoformat()
+                timestamp=now_iso
             )
 
-            for webhook in webhooks:
-                background_tasks.add_task(send_webhook_notification, webhook.url, webhook_payload.dict())
-                # Update last_used_at
-                webhook.last_used_at = datetime.utcnow()
-                db.commit()
-
-        response_data = SearchResponse(
-            success=True,
-            current_price=getattr(result, 'current_price', 'unknown'),
-            total_flights=len(result.flights),
-            flights=formatted_flights,
-            search_url=search_url,
-            timestamp=datetime.now().isoformat(),
-            search_id=search_id
-        )
-        return response_data
+            # One background task delivers to all webhooks concurrently
+            background_tasks.add_task(
+                fan_out_webhooks, [url for _, url in webhooks], webhook_payload.model_dump()
+            )
+
+            background_tasks.add_task(
+                persist_webhook_usage, SessionLocal, [webhook_id for webhook_id, _ in webhooks]
+            )
+
+        # Flight data is trusted internal output, so skip re-validating it
+        # through SearchResponse (kept on the route for the OpenAPI schema)
+        return ORJSONResponse({
+            "success": True,
+            "current_price": result["current_price"],
+            "total_flights": len(formatted_flights),
+            "flights": formatted_flights,
+            "search_url": search_url,
+            "timestamp": now_iso,
+            "error": None,
+            "search_id": search_id
+        })
 
     except HTTPException:
         # Re-raise HTTPExceptions (like validation errors) as-is
@@ -642,11 +768,11 @@ async def search_flights_endpoint(
         error_response = ErrorResponse(
             error=str(e),
             error_code="SEARCH_ERROR",
-            timestamp=datetime.now().isoformat()
+            timestamp=now_iso
         )
         raise HTTPException(
             status_code=400,
-            detail=error_response.dict()
+            detail=error_response.model_dump()
         )
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
@@ -655,22 +781,58 @@ async def search_flights_endpoint(
             detail=ErrorResponse(
                 error=f"Internal server error: {str(e)}",
                 error_code="INTERNAL_ERROR",
-                timestamp=datetime.now().isoformat()
-            ).dict()
+                timestamp=now_iso
+            ).model_dump()
         )
 
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Weak If-None-Match comparison: "*" or any listed tag equal to etag, ignoring W/"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+# Handlers that only talk to the (synchronous) database are plain defs so
+# FastAPI runs them in its threadpool instead of blocking the event loop
 @app.get("/search/{search_id}", tags=["Flights"])
-async def get_search_result(search_id: str, db: Session = Depends(get_db)):
+def get_search_result(search_id: str, request: Request, db: Session = Depends(get_db)):
     """Retrieve previous search results by ID"""
     search = get_search_history(db, search_id)
     if not search:
         raise HTTPException(status_code=404, detail="Search not found")
 
-    return {
+    # Stored JSON is already plain data; skip jsonable_encoder's recursive walk
+    body = orjson.dumps({
         "request": search.request_data,
         "result": search.result_data,
         "timestamp": search.timestamp.isoformat()
-    }
+    })
+
+    # History entries never change, so clients can revalidate with If-None-Match
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+    if _etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _store_webhook(db: Session, webhook_url: str) -> bool:
+    """Insert a webhook unless it is already registered; returns whether one was created."""
+    if get_webhook(db, webhook_url):
+        return False
+    # Create webhook with ID = URL (for uniqueness)
+    webhook_id = webhook_url[:200]  # Limit ID length
+    create_webhook(db, webhook_id, webhook_url)
+    return True
+
 
 @app.post("/webhooks", tags=["Webhooks"])
 async def register_webhook(request: Request, db: Session = Depends(get_db)):
@@ -695,13 +857,10 @@ async def register_webhook(request: Request, db: Session = Depends(get_db)):
         if not webhook_url.startswith(("http://", "https://")):
             raise HTTPException(status_code=400, detail="Invalid webhook URL format")
         
-        existing = get_webhook(db, webhook_url)
-        if existing:
+        # The body has to be read on the event loop (async def), but the
+        # synchronous lookup and commit run in the threadpool
+        if not await run_in_threadpool(_store_webhook, db, webhook_url):
             return {"message": "Webhook already registered"}
-        
-        # Create webhook with ID = URL (for uniqueness)
-        webhook_id = webhook_url[:200]  # Limit ID length
-        create_webhook(db, webhook_id, webhook_url)
         logger.info(f"Registered webhook: {webhook_url}")
         return {"message": "Webhook registered successfully"}
     except HTTPException:
@@ -711,7 +870,7 @@ async def register_webhook(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to register webhook: {str(e)}")
 
 @app.delete("/webhooks", tags=["Webhooks"])
-async def unregister_webhook(webhook_url: str, db: Session = Depends(get_db)):
+def unregister_webhook(webhook_url: str, db: Session = Depends(get_db)):
     """Unregister a webhook URL"""
     webhook = get_webhook(db, webhook_url)
     if not webhook:
@@ -719,17 +878,17 @@ async def unregister_webhook(webhook_url: str, db: Session = Depends(get_db)):
     
     webhook.active = False
     db.commit()
+    invalidate_webhook_cache()
     logger.info(f"Unregistered webhook: {webhook_url}")
     return {"message": "Webhook unregistered successfully"}
 
 @app.get("/webhooks", tags=["Webhooks"])
-async def list_webhooks(db: Session = Depends(get_db)):
+def list_webhooks(db: Session = Depends(get_db)):
     """List all registered webhooks"""
-    webhooks = get_all_webhooks(db)
-    return {"webhooks": [webhook.url for webhook in webhooks]}
+    return {"webhooks": get_active_webhook_urls(db)}
 
 @app.post("/alerts", response_model=PriceAlertResponse, tags=["Price Alerts"])
-async def create_price_alert(request: PriceAlertRequest, db: Session = Depends(get_db)):
+def create_price_alert(request: PriceAlertRequest, db: Session = Depends(get_db)):
     """Create a new price alert for flight monitoring"""
     try:
         # Sanitize inputs
@@ -772,8 +931,9 @@ async def create_price_alert(request: PriceAlertRequest, db: Session = Depends(g
         if not validate_airport_code(destination_code):
             raise HTTPException(status_code=400, detail=f"Invalid destination airport code: {destination_code}")
 
-        # Generate unique alert ID
-        alert_id = f"alert_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{origin_code}_{destination_code}"
+        # Generate unique alert ID; random so same-route alerts created in the
+        # same second don't collide on the unique constraint
+        alert_id = f"alert_{origin_code}_{destination_code}_{uuid.uuid4().hex}"
 
         # Create alert data
         alert_data = {
@@ -788,7 +948,9 @@ async def create_price_alert(request: PriceAlertRequest, db: Session = Depends(g
             "currency": request.currency,
             "email": request.email,
             "notification_channels": request.notification_channels,
-            "status": "active"
+            "status": "active",
+            # Stored naive, matching the column's utcnow default
+            "created_at": datetime.now(timezone.utc).replace(tzinfo=None)
         }
 
         # Store the alert in database
@@ -796,20 +958,22 @@ async def create_price_alert(request: PriceAlertRequest, db: Session = Depends(g
 
         logger.info(f"Created {request.trip_type} price alert: {alert_id} for {origin_code} → {destination_code}")
 
-        return PriceAlertResponse(
-            alert_id=db_alert.alert_id,
-            trip_type=db_alert.trip_type,
-            origin=db_alert.origin,
-            destination=db_alert.destination,
-            depart_date=db_alert.depart_date,
-            return_date=db_alert.return_date,
-            target_price=db_alert.target_price,
-            currency=db_alert.currency,
-            email=db_alert.email,
-            notification_channels=db_alert.notification_channels,
-            status=db_alert.status,
-            created_at=db_alert.created_at.isoformat()
-        )
+        # Built from validated input, so skip re-validating through
+        # PriceAlertResponse (kept on the route for the OpenAPI schema)
+        return ORJSONResponse({
+            "alert_id": db_alert.alert_id,
+            "trip_type": db_alert.trip_type,
+            "origin": db_alert.origin,
+            "destination": db_alert.destination,
+            "depart_date": db_alert.depart_date,
+            "return_date": db_alert.return_date,
+            "target_price": db_alert.target_price,
+            "currency": db_alert.currency,
+            "email": db_alert.email,
+            "notification_channels": db_alert.notification_channels,
+            "status": db_alert.status,
+            "created_at": db_alert.created_at.isoformat()
+        })
 
     except HTTPException:
         # Re-raise HTTPExceptions (like validation errors) as-is
@@ -822,32 +986,35 @@ async def create_price_alert(request: PriceAlertRequest, db: Session = Depends(g
         )
 
 @app.get("/alerts", tags=["Price Alerts"])
-async def list_price_alerts(db: Session = Depends(get_db)):
-    """List all active price alerts"""
-    alerts = get_all_active_alerts(db)
-    
-    alerts_list = [
-        PriceAlertResponse(
-            alert_id=alert.alert_id,
-            trip_type=alert.trip_type,
-            origin=alert.origin,
-            destination=alert.destination,
-            depart_date=alert.depart_date,
-            return_date=alert.return_date,
-            target_price=alert.target_price,
-            currency=alert.currency,
-            email=alert.email,
-            notification_channels=alert.notification_channels,
-            status=alert.status,
-            created_at=alert.created_at.isoformat()
-        )
-        for alert in alerts
-    ]
+def list_price_alerts(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum alerts to return, newest first (all if omitted)"),
+    offset: int = Query(0, ge=0, description="Number of alerts to skip"),
+    db: Session = Depends(get_db)
+):
+    """List active price alerts, newest first; pass limit/offset to page through them"""
+    alerts = get_all_active_alerts(db, limit=limit, offset=offset)
 
-    return {"alerts": [alert.dict() for alert in alerts_list]}
+    # Rows were validated on write; build plain dicts instead of a model per alert
+    return ORJSONResponse({"alerts": [
+        {
+            "alert_id": alert.alert_id,
+            "trip_type": alert.trip_type,
+            "origin": alert.origin,
+            "destination": alert.destination,
+            "depart_date": alert.depart_date,
+            "return_date": alert.return_date,
+            "target_price": alert.target_price,
+            "currency": alert.currency,
+            "email": alert.email,
+            "notification_channels": alert.notification_channels,
+            "status": alert.status,
+            "created_at": alert.created_at.isoformat()
+        }
+        for alert in alerts
+    ], "limit": limit, "offset": offset})
 
 @app.delete("/alerts/{alert_id}", tags=["Price Alerts"])
-async def delete_price_alert(alert_id: str, db: Session = Depends(get_db)):
+def delete_price_alert(alert_id: str, db: Session = Depends(get_db)):
     """Delete a price alert by ID"""
     alert = get_price_alert(db, alert_id)
     if not alert:
@@ -864,42 +1031,242 @@ async def delete_price_alert(alert_id: str, db: Session = Depends(get_db)):
 
 # NaturalLanguageQuery is now in api.models
 
-def call_ai_provider(provider: str, prompt: str, api_key: str, model: Optional[str] = None) -> str:
+# Environment variable holding each provider's API key
+_ENV_VAR_MAP = {
+    "openai": "OPENAI_API_KEY",
+    "google": "GOOGLE_AI_API_KEY",
+    "deepseek": "DEEPSEEK_API_KEY"
+}
+
+# Model used when the request doesn't name one
+_DEFAULT_MODELS = {
+    "openai": "gpt-4o-mini",
+    "google": "gemini-1.5-flash",
+    "deepseek": "deepseek-chat"
+}
+
+# Per-provider backpressure for outbound AI calls
+_AI_SEMAPHORES = {
+    provider: asyncio.Semaphore(limit) for provider, limit in AI_MAX_CONCURRENCY.items()
+}
+
+# Markdown code fences some models wrap around their JSON reply
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+# Fields the AI must extract before a search can run, in reporting order
+_AI_REQUIRED_FIELDS = ("origin", "destination", "depart_date", "trip_type")
+
+# Prompt for ai_flight_search: the query is spliced between a fixed prefix
+# and suffix, so there's no str.format pass per request.
+# Kept short since providers are asked for JSON output (and OpenAI gets the
+# full ParsedFlightQuery schema); the few-shot block is opt-in.
+_AI_PROMPT_PREFIX = 'Extract flight search parameters from this query: "'
+_AI_PROMPT_BASE = """"
+Reply with a JSON object with fields origin, destination, depart_date (YYYY-MM-DD or flexible like "next weekend"), \
+return_date (null for one-way), trip_type (one-way, round-trip or multi-city), adults, children, \
+seat_class (economy, premium_economy, business or first), max_stops (null for any, 0 for nonstop), \
+budget_max (null if none), preferred_airlines (array) and flexible_dates (boolean).
+Words like return, back or round trip mean round-trip: extract both dates.
+"""
+
+_AI_PROMPT_EXAMPLES = """
+Examples:
+Query: "Find cheap flights from New York to London next month under $500"
+Response: {"origin": "New York", "destination": "London", "depart_date": "next month", "return_date": null, "trip_type": "one-way", "adults": 1, "children": 0, "seat_class": "economy", "max_stops": null, "budget_max": 500, "preferred_airlines": [], "flexible_dates": true}
+
+Query: "Book business class round trip from Paris to Tokyo departing next weekend returning next month with Delta or United"
+Response: {"origin": "Paris", "destination": "Tokyo", "depart_date": "next weekend", "return_date": "next month", "trip_type": "round-trip", "adults": 1, "children": 0, "seat_class": "business", "max_stops": null, "budget_max": null, "preferred_airlines": ["Delta", "United"], "flexible_dates": false}
+
+Query: "Direct flights from Chicago to Miami for 2 adults and 1 child in December"
+Response: {"origin": "Chicago", "destination": "Miami", "depart_date": "2024-12-01", "return_date": null, "trip_type": "one-way", "adults": 2, "children": 1, "seat_class": "economy", "max_stops": 0, "budget_max": null, "preferred_airlines": [], "flexible_dates": true}
+
+Query: "Round trip flights from London to New York leaving December 15 returning December 22 under $800"
+Response: {"origin": "London", "destination": "New York", "depart_date": "2024-12-15", "return_date": "2024-12-22", "trip_type": "round-trip", "adults": 1, "children": 0, "seat_class": "economy", "max_stops": null, "budget_max": 800, "preferred_airlines": [], "flexible_dates": false}
+
+Query: "One stop business class return flight from Tokyo to Sydney for next weekend"
+Response: {"origin": "Tokyo", "destination": "Sydney", "depart_date": "next weekend", "return_date": null, "trip_type": "round-trip", "adults": 1, "children": 0, "seat_class": "business", "max_stops": 1, "budget_max": null, "preferred_airlines": [], "flexible_dates": false}
+"""
+
+_AI_PROMPT_SUFFIX = _AI_PROMPT_BASE + (_AI_PROMPT_EXAMPLES if AI_PROMPT_EXAMPLES else "")
+
+def _strict_json_schema(model) -> Dict[str, Any]:
+    """JSON schema in the form OpenAI strict mode accepts: every field required, no extras, no defaults"""
+    schema = model.model_json_schema()
+    for prop in schema["properties"].values():
+        prop.pop("default", None)
+    schema["required"] = list(schema["properties"])
+    schema["additionalProperties"] = False
+    return schema
+
+
+# OpenAI structured output: with strict mode the provider enforces the ParsedFlightQuery shape
+_PARSED_QUERY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "parsed_flight_query",
+        "strict": True,
+        "schema": _strict_json_schema(ParsedFlightQuery),
+    },
+}
+# Plain JSON mode for models without structured output support
+_JSON_OBJECT_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Model families that accept json_schema response formats; anything else
+# (gpt-3.5-turbo, gpt-4, gpt-4-turbo, ...) would answer 400 and gets JSON mode
+_STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+_NO_STRUCTURED_OUTPUT_MODELS = ("gpt-4o-2024-05-13", "o1-mini", "o1-preview")
+
+
+def _openai_response_format(model_name: str) -> Dict[str, Any]:
+    """response_format for an OpenAI model: the strict schema where supported, else JSON mode"""
+    if model_name.startswith(_STRUCTURED_OUTPUT_MODELS) and not model_name.startswith(_NO_STRUCTURED_OUTPUT_MODELS):
+        return _PARSED_QUERY_RESPONSE_FORMAT
+    return _JSON_OBJECT_RESPONSE_FORMAT
+
+
+# Longest a provider call can still be running: every attempt timing out plus capped backoff
+_AI_CLIENT_CLOSE_DELAY = (AI_REQUEST_TIMEOUT + 10) * (AI_MAX_RETRIES + 1)
+
+
+class _ClientPool:
+    """
+    Provider clients (and their connection pools) reused per API key.
+
+    Keys come from requests, so the pool is bounded: the least recently used
+    client is evicted and closed once any call it was serving has finished.
+    """
+
+    def __init__(self, maxsize: int, create: Callable[[str], Any], close: Callable[[Any], Awaitable[None]]):
+        self._maxsize = maxsize
+        self._create = create
+        self._close = close
+        self._clients: "OrderedDict[str, Any]" = OrderedDict()
+        # Evicted clients waiting to be closed, by their close task
+        self._retiring: Dict[asyncio.Task, Any] = {}
+
+    def get(self, api_key: str) -> Any:
+        client = self._clients.get(api_key)
+        if client is not None:
+            self._clients.move_to_end(api_key)
+            return client
+        client = self._clients[api_key] = self._create(api_key)
+        if len(self._clients) > self._maxsize:
+            _, evicted = self._clients.popitem(last=False)
+            task = asyncio.ensure_future(self._close_later(evicted))
+            self._retiring[task] = evicted
+            task.add_done_callback(self._retiring.pop)
+        return client
+
+    async def _close_later(self, client: Any) -> None:
+        # A call that started just before eviction may still be using the client
+        await asyncio.sleep(_AI_CLIENT_CLOSE_DELAY)
+        await self._close(client)
+
+    async def aclose(self) -> None:
+        """Close every client now, including evicted ones still waiting (application shutdown)."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for task, client in list(self._retiring.items()):
+            task.cancel()
+            clients.append(client)
+        for client in clients:
+            try:
+                await self._close(client)
+            except Exception as e:
+                logger.warning(f"Failed to close AI provider client: {e}")
+
+
+async def _close_openai_client(client: Any) -> None:
+    await client.close()
+
+
+# The SDK already backs off on 429/5xx; bound how often it retries
+_openai_clients = _ClientPool(
+    8,
+    lambda api_key: _load_openai().AsyncOpenAI(
+        api_key=api_key, timeout=AI_REQUEST_TIMEOUT, max_retries=AI_MAX_RETRIES
+    ),
+    _close_openai_client,
+)
+
+
+def _create_google_client(api_key: str):
+    """Gemini client bound to one API key (genai.configure() would set it process-wide)"""
+    return _load_generativelanguage().GenerativeServiceClient(client_options={"api_key": api_key})
+
+
+async def _close_google_client(client: Any) -> None:
+    client.transport.close()
+
+
+_google_clients = _ClientPool(8, _create_google_client, _close_google_client)
+
+
+def _google_request(model_name: str, prompt: str):
+    """JSON-mode generate_content request for a Gemini model"""
+    glm = _load_generativelanguage()
+    return glm.GenerateContentRequest(
+        model=f"models/{model_name}",
+        contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+        generation_config=glm.GenerationConfig(
+            response_mime_type="application/json",
+            max_output_tokens=300,
+            temperature=0.1
+        )
+    )
+
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """Seconds to wait before retrying a throttled or failed provider call (response is None after a network error)"""
+    retry_after = response.headers.get("retry-after", "") if response is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), 10.0)
+    return 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+
+
+async def call_ai_provider(provider: str, prompt: str, api_key: str, model: Optional[str] = None) -> str:
     """Call the specified AI provider with the given prompt"""
+    # Rough estimate (~4 characters per token) to spot oversized prompts in logs
+    logger.debug(f"Calling {provider} with a ~{len(prompt) // 4} token prompt")
+
     if provider == "openai":
-        if not OPENAI_AVAILABLE:
+        if _load_openai() is None:
             raise HTTPException(status_code=503, detail="OpenAI not available. Install with: pip install openai")
 
-        openai.api_key = api_key
-        model_name = model or "gpt-4o-mini"
+        model_name = model or _DEFAULT_MODELS["openai"]
 
-        response = openai.ChatCompletion.create(
+        response = await _openai_clients.get(api_key).chat.completions.create(
             model=model_name,
             messages=[
                 {"role": "system", "content": "You are a travel search query parser. Always return valid JSON."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=300,
-            temperature=0.1
+            temperature=0.1,
+            response_format=_openai_response_format(model_name)
         )
         return response.choices[0].message.content.strip()
 
     elif provider == "google":
-        if not GOOGLE_AI_AVAILABLE:
+        if _load_generativelanguage() is None:
             raise HTTPException(status_code=503, detail="Google AI not available. Install with: pip install google-generativeai")
 
-        genai.configure(api_key=api_key)
-        model_name = model or "gemini-pro"
+        model_name = model or _DEFAULT_MODELS["google"]
 
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        # The Gemini client is blocking; keep its call off the event loop
+        # and stop waiting on it after AI_REQUEST_TIMEOUT
+        client = _google_clients.get(api_key)
+        try:
+            response = await asyncio.wait_for(
+                asyncio.to_thread(client.generate_content, request=_google_request(model_name, prompt)),
+                timeout=AI_REQUEST_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Google AI request timed out")
+        return "".join(part.text for part in response.candidates[0].content.parts).strip()
 
     elif provider == "deepseek":
-        if not REQUESTS_AVAILABLE:
-            raise HTTPException(status_code=503, detail="Requests not available")
-
-        model_name = model or "deepseek-chat"
+        model_name = model or _DEFAULT_MODELS["deepseek"]
         url = "https://api.deepseek.com/v1/chat/completions"
 
         headers = {
@@ -914,10 +1281,26 @@ def call_ai_provider(provider: str, prompt: str, api_key: str, model: Optional[s
                 {"role": "user", "content": prompt}
             ],
             "max_tokens": 300,
-            "temperature": 0.1
+            "temperature": 0.1,
+            "response_format": {"type": "json_object"}
         }
 
-        response = requests.post(url, headers=headers, json=data)
+        for attempt in range(AI_MAX_RETRIES + 1):
+            response = None
+            try:
+                response = await get_http_client().post(url, headers=headers, json=data, timeout=AI_REQUEST_TIMEOUT)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                # Timeouts and dropped connections are as transient as a 429/5xx
+                if attempt == AI_MAX_RETRIES:
+                    status_code = 504 if isinstance(e, httpx.TimeoutException) else 503
+                    raise HTTPException(status_code=status_code, detail=f"DeepSeek request failed: {type(e).__name__}")
+                logger.warning(f"DeepSeek request failed ({type(e).__name__}), retrying (attempt {attempt + 1}/{AI_MAX_RETRIES})")
+            else:
+                if attempt == AI_MAX_RETRIES or (response.status_code != 429 and response.status_code < 500):
+                    break
+                logger.warning(f"DeepSeek returned {response.status_code}, retrying (attempt {attempt + 1}/{AI_MAX_RETRIES})")
+            await asyncio.sleep(_retry_delay(response, attempt))
+
         if response.status_code == 200:
             return response.json()["choices"][0]["message"]["content"].strip()
         else:
@@ -926,6 +1309,58 @@ def call_ai_provider(provider: str, prompt: str, api_key: str, model: Optional[s
     else:
         raise HTTPException(status_code=400, detail=f"Unsupported AI provider: {provider}")
 
+async def parse_ai_query(provider: str, query: str, api_key: str, model: Optional[str] = None) -> ParsedFlightQuery:
+    """
+    Turn a natural language query into search parameters via the AI provider.
+
+    Successful parses are cached per (provider, model, query) so repeated
+    queries skip the LLM round trip; the query is keyed case- and
+    whitespace-insensitively. Relative dates stay relative and are
+    resolved at search time.
+    """
+    cache_key = generate_cache_key(
+        "ai_query", provider=provider, model=model or _DEFAULT_MODELS[provider],
+        query=" ".join(query.lower().split())
+    )
+    use_cache = AI_QUERY_CACHE_TTL > 0
+    cached = await get_cached(cache_key) if use_cache else None
+    if cached:
+        return ParsedFlightQuery.model_validate(cached)
+
+    # Create the parsing prompt
+    prompt = _AI_PROMPT_PREFIX + query + _AI_PROMPT_SUFFIX
+
+    # Call the AI provider
+    # Bound in-flight calls per provider so bursts queue here instead of hitting remote 429s
+    async with _AI_SEMAPHORES[provider]:
+        ai_response = await call_ai_provider(provider, prompt, api_key, model)
+
+    # JSON mode should return bare JSON; strip fences in case a custom model ignores it
+    # (responses are already stripped, so a fenced one starts with backticks)
+    if ai_response.startswith("```"):
+        ai_response = _FENCE_RE.sub("", ai_response)
+
+    try:
+        parsed_query = ParsedFlightQuery.model_validate_json(ai_response)
+    except ValidationError as e:
+        logger.error(f"Failed to parse AI response: {ai_response}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"AI parsing failed: {str(e)}"
+        )
+
+    # Validate required fields
+    for field_name in _AI_REQUIRED_FIELDS:
+        if not getattr(parsed_query, field_name):
+            raise HTTPException(
+                status_code=400,
+                detail=f"AI parsing incomplete: missing {field_name}"
+            )
+
+    if use_cache:
+        await set_cached(cache_key, parsed_query.model_dump(), ttl=AI_QUERY_CACHE_TTL)
+    return parsed_query
+
 @app.post("/ai/search", tags=["AI Features"])
 async def ai_flight_search(request: NaturalLanguageQuery):
     """
@@ -940,133 +1375,39 @@ async def ai_flight_search(request: NaturalLanguageQuery):
     """
     try:
         # Get API key based on provider
-        env_var_map = {
-            "openai": "OPENAI_API_KEY",
-            "google": "GOOGLE_AI_API_KEY",
-            "deepseek": "DEEPSEEK_API_KEY"
-        }
-
-        api_key = request.api_key or os.getenv(env_var_map.get(request.provider, ""))
+        api_key = request.api_key or os.getenv(_ENV_VAR_MAP.get(request.provider, ""))
         if not api_key:
             # Return a graceful error instead of failing
-            return ErrorResponse(
-                success=False,
-                error=f"{request.provider.upper()} API key required. Set {env_var_map.get(request.provider, 'API_KEY')} environment variable or provide in request.",
-                error_code="AI_API_KEY_MISSING",
-                timestamp=datetime.now().isoformat()
-            )
-
-        # Create the parsing prompt
-        prompt = f"""
-        Extract flight search parameters from this natural language query: "{request.query}"
-
-        Analyze the query carefully and extract ALL relevant flight search information. Consider:
-        - Cities/airports mentioned (origin and destination)
-        - Dates (specific dates, or relative like "next week", "December", "weekend")
-        - Trip type (one-way, round-trip, return, back-and-forth, multi-city)
-        - Return dates for round-trip flights (when mentioned)
-        - Number of passengers (adults, children, infants)
-        - Seat class preferences (economy, business, first class, etc.)
-        - Budget constraints (under $X, cheap, affordable, etc.)
-        - Airline preferences (specific airlines mentioned)
-        - Stop preferences (direct, nonstop, 1 stop, 2 stops, etc.)
-        - Any special requirements or filters
-
-        IMPORTANT: For round-trip queries, ALWAYS extract both departure AND return dates when mentioned.
-        Words indicating round-trip: round trip, return, back, round-trip, return flight, back and forth, etc.
-
-        Return ONLY a valid JSON object with these exact fields:
-        {{
-            "origin": "departure city or airport code",
-            "destination": "arrival city or airport code",
-            "depart_date": "departure date in YYYY-MM-DD format or flexible like 'next weekend'",
-            "return_date": "return date in YYYY-MM-DD format or flexible like 'next month', or null for one-way",
-            "trip_type": "one-way, round-trip, or multi-city",
-            "adults": number of adult passengers (default 1),
-            "children": number of children (default 0),
-            "seat_class": "economy, premium_economy, business, or first" (default "economy"),
-            "max_stops": maximum stops preferred (null for any, 0 for nonstop, 1, 2, etc.),
-            "budget_max": maximum budget in local currency (null if not specified),
-            "preferred_airlines": array of preferred airline names (empty array if none),
-            "flexible_dates": boolean indicating if dates are flexible (default false)
-        }}
-
-        Examples:
-        Query: "Find cheap flights from New York to London next month under $500"
-        Response: {{"origin": "New York", "destination": "London", "depart_date": "next month", "return_date": null, "trip_type": "one-way", "adults": 1, "children": 0, "seat_class": "economy", "max_stops": null, "budget_max": 500, "preferred_airlines": [], "flexible_dates": true}}
-
-        Query: "Book business class round trip from Paris to Tokyo departing next weekend returning next month with Delta or United"
-        Response: {{"origin": "Paris", "destination": "Tokyo", "depart_date": "next weekend", "return_date": "next month", "trip_type": "round-trip", "adults": 1, "children": 0, "seat_class": "business", "max_stops": null, "budget_max": null, "preferred_airlines": ["Delta", "United"], "flexible_dates": false}}
-
-        Query: "Direct flights from Chicago to Miami for 2 adults and 1 child in December"
-        Response: {{"origin": "Chicago", "destination": "Miami", "depart_date": "2024-12-01", "return_date": null, "trip_type": "one-way", "adults": 2, "children": 1, "seat_class": "economy", "max_stops": 0, "budget_max": null, "preferred_airlines": [], "flexible_dates": true}}
-
-        Query: "Round trip flights from London to New York leaving December 15 returning December 22 under $800"
-        Response: {{"origin": "London", "destination": "New York", "depart_date": "2024-12-15", "return_date": "2024-12-22", "trip_type": "round-trip", "adults": 1, "children": 0, "seat_class": "economy", "max_stops": null, "budget_max": 800, "preferred_airlines": [], "flexible_dates": false}}
-
-        Query: "One stop business class return flight from Tokyo to Sydney for next weekend"
-        Response: {{"origin": "Tokyo", "destination": "Sydney", "depart_date": "next weekend", "return_date": null, "trip_type": "round-trip", "adults": 1, "children": 0, "seat_class": "business", "max_stops": 1, "budget_max": null, "preferred_airlines": [], "flexible_dates": false}}
-        """
-
-        # Call the AI provider
-        ai_response = call_ai_provider(request.provider, prompt, api_key, request.model)
-
-        # Clean up the response (remove markdown code blocks if present)
-        if ai_response.startswith("```json"):
-            ai_response = ai_response[7:]
-        if ai_response.startswith("```"):
-            ai_response = ai_response[3:]
-        if ai_response.endswith("```"):
-            ai_response = ai_response[:-3]
-
-        ai_response = ai_response.strip()
-
-        try:
-            parsed_params = json.loads(ai_response)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI response: {ai_response}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"AI parsing failed: {str(e)}"
-            )
-
-        # Validate required fields
-        required_fields = ["origin", "destination", "depart_date", "trip_type"]
-        for field in required_fields:
-            if field not in parsed_params or not parsed_params[field]:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"AI parsing incomplete: missing {field}"
-                )
+            return ORJSONResponse({
+                "success": False,
+                "error": f"{request.provider.upper()} API key required. Set {_ENV_VAR_MAP.get(request.provider, 'API_KEY')} environment variable or provide in request.",
+                "error_code": "AI_API_KEY_MISSING",
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            })
 
-        # Set defaults for optional fields
-        parsed_params.setdefault("return_date", None)
-        parsed_params.setdefault("adults", 1)
-        parsed_params.setdefault("seat_class", "economy")
+        parsed_query = await parse_ai_query(request.provider, request.query, api_key, request.model)
 
         # Now perform the actual flight search with parsed parameters
         search_request = FlightSearchRequest(
-            trip_type=parsed_params["trip_type"],
+            trip_type=parsed_query.trip_type,
             segments=None,
-            origin=parsed_params["origin"],
-            destination=parsed_params["destination"],
-            depart_date=parsed_params["depart_date"],
-            return_date=parsed_params["return_date"],
-            adults=parsed_params.get("adults", 1),
-            children=parsed_params.get("children", 0),
+            origin=parsed_query.origin,
+            destination=parsed_query.destination,
+            depart_date=parsed_query.depart_date,
+            return_date=parsed_query.return_date,
+            adults=parsed_query.adults,
+            children=parsed_query.children,
             infants_seat=0,
             infants_lap=0,
-            seat_class=parsed_params.get("seat_class", "economy"),
-            max_stops=parsed_params.get("max_stops"),
+            seat_class=parsed_query.seat_class,
+            max_stops=parsed_query.max_stops,
             fetch_mode="local"
         )
 
         # Use the existing search endpoint logic
-        # Convert city names to airport codes
-        if hasattr(search_request, 'origin') and search_request.origin:
-            search_request.origin = convert_city_to_airport(search_request.origin)
-        if hasattr(search_request, 'destination') and search_request.destination:
-            search_request.destination = convert_city_to_airport(search_request.destination)
+        # Convert city names to airport codes (both are guaranteed by _AI_REQUIRED_FIELDS)
+        search_request.origin = convert_city_to_airport(search_request.origin)
+        search_request.destination = convert_city_to_airport(search_request.destination)
 
         # Get flight segments based on trip type
         segments = search_request.get_segments()
@@ -1101,8 +1442,7 @@ async def ai_flight_search(request: NaturalLanguageQuery):
             "fetch_mode": search_request.fetch_mode
         }
 
-        # Perform search asynchronously in a thread pool
-        result = await asyncio.to_thread(search_flights, **search_params)
+        result = await cached_search(search_params)
 
         # Generate search URL
         search_url = get_flights_url(
@@ -1118,36 +1458,22 @@ async def ai_flight_search(request: NaturalLanguageQuery):
             max_stops=search_params["max_stops"]
         )
 
-        # Format flights for response
-        formatted_flights = []
-        for flight in result.flights:
-            formatted_flights.append({
-                "name": getattr(flight, 'name', 'Unknown'),
-                "departure": getattr(flight, 'departure', ''),
-                "arrival": getattr(flight, 'arrival', ''),
-                "duration": getattr(flight, 'duration', ''),
-                "stops": getattr(flight, 'stops', 0),
-                "price": getattr(flight, 'price', ''),
-                "delay": getattr(flight, 'delay', None)
-            })
+        formatted_flights = result["flights"]
 
         # Determine model name for response
-        model_used = request.model or {
-            "openai": "gpt-4o-mini",
-            "google": "gemini-pro",
-            "deepseek": "deepseek-chat"
-        }.get(request.provider, "unknown")
+        model_used = request.model or _DEFAULT_MODELS.get(request.provider, "unknown")
 
-        return {
+        # Already plain data; skip jsonable_encoder's recursive walk
+        return ORJSONResponse({
             "success": True,
-            "parsed_query": parsed_params,
-            "total_flights": len(result.flights),
+            "parsed_query": parsed_query.model_dump(),
+            "total_flights": len(formatted_flights),
             "flights": formatted_flights[:10],  # Return top 10 results
             "search_url": search_url,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "ai_provider": request.provider,
             "ai_model": model_used
-        }
+        })
 
     except HTTPException:
         raise
@@ -1159,19 +1485,73 @@ async def ai_flight_search(request: NaturalLanguageQuery):
         )
 
 # Initialize database on startup
+# Background task deleting expired search history (None when retention is off)
+_prune_task: Optional[asyncio.Task] = None
+
+
+def _prune_search_history_once() -> None:
+    """Delete search history older than SEARCH_HISTORY_RETENTION_DAYS."""
+    db = SessionLocal()
+    try:
+        pruned = prune_search_history(db, SEARCH_HISTORY_RETENTION_DAYS)
+        if pruned:
+            logger.info(f"Pruned {pruned} search history entries older than {SEARCH_HISTORY_RETENTION_DAYS} days")
+    finally:
+        db.close()
+
+
+async def _prune_search_history_periodically() -> None:
+    """Prune search history now and then every SEARCH_HISTORY_PRUNE_INTERVAL seconds."""
+    while True:
+        try:
+            await asyncio.to_thread(_prune_search_history_once)
+        except Exception as e:
+            logger.error(f"Failed to prune search history: {e}")
+        await asyncio.sleep(SEARCH_HISTORY_PRUNE_INTERVAL)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on application startup."""
+    global _prune_task
     init_db()
     logger.info("✅ Database initialized")
 
+    # Keep the search history table bounded while the process runs (opt-in)
+    if SEARCH_HISTORY_RETENTION_DAYS > 0:
+        _prune_task = asyncio.create_task(_prune_search_history_periodically())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled outbound connections and search threads on application shutdown."""
+    if _prune_task is not None:
+        _prune_task.cancel()
+    await close_http_client()
+    await close_redis_client()
+    await _openai_clients.aclose()
+    await _google_clients.aclose()
+    _search_executor.shutdown(wait=False, cancel_futures=True)
+
 
 if __name__ == "__main__":
     # Simple startup test
     print("🚀 Starting FlyMind API...")
     print(f"📦 Flights module available: {FLIGHTS_AVAILABLE}")
-    port = int(os.getenv("PORT", 8001))
-    print(f"📡 Listening on port {port}")
+    print(f"📡 Listening on port {API_PORT} with {WORKERS} worker(s)")
     print("🏥 Health check available at: /health")
     print("📖 API docs available at: /docs")
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    # Import string (not the app object) so uvicorn can spawn worker processes.
+    # Outbound clients (Redis, httpx) are created lazily inside each worker.
+    # Production runs under gunicorn, see api/Dockerfile.
+    uvicorn.run(
+        "api.api:app",
+        host=API_HOST,
+        port=API_PORT,
+        workers=WORKERS,
+        # "auto" picks uvloop/httptools when installed (uvloop isn't on Windows)
+        loop="auto",
+        http="auto",
+        log_level="info",
+        access_log=ACCESS_LOG
+    )
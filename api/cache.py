@@ -3,27 +3,28 @@ Redis caching for API responses and frequently accessed data.
 """
 
 from typing import Optional, Any
-import json
 import hashlib
-from api.config import REDIS_ENABLED, REDIS_URL
+import orjson
+import importlib.util
+import time
+from api.config import REDIS_ENABLED, REDIS_URL, REDIS_CONNECT_TIMEOUT, REDIS_RETRY_INTERVAL
 import os
 from api.logger import logger
 
-# Try to import redis
-try:
-    import redis
-    REDIS_AVAILABLE = True
-except ImportError:
-    REDIS_AVAILABLE = False
-    redis = None
+# Probe for redis without importing it; the client library is only
+# loaded once caching is enabled and first used
+REDIS_AVAILABLE = importlib.util.find_spec("redis") is not None
 
-# Global Redis client
+# Global Redis client (redis.asyncio, so cache round trips don't block the event loop)
 _redis_client: Optional[Any] = None
+# Monotonic time before which no new connection is attempted; a down Redis
+# then costs one failed connect per REDIS_RETRY_INTERVAL, not one per request
+_redis_retry_at = 0.0
 
 
-def get_redis_client():
-    """Get or create Redis client."""
-    global _redis_client
+async def get_redis_client():
+    """Get or create the async Redis client."""
+    global _redis_client, _redis_retry_at
     
     # Redis is optional - if not enabled or not available, return None (graceful degradation)
     if not REDIS_ENABLED:
@@ -33,38 +34,62 @@ def get_redis_client():
         return None
     
     if _redis_client is None:
+        now = time.monotonic()
+        if now < _redis_retry_at:
+            return None
+        # Set before connecting so concurrent callers don't each try too
+        _redis_retry_at = now + REDIS_RETRY_INTERVAL
+        client = None
         try:
-            _redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+            import redis.asyncio as aioredis
+            client = aioredis.from_url(
+                REDIS_URL, max_connections=50, socket_connect_timeout=REDIS_CONNECT_TIMEOUT
+            )
             # Test connection
-            _redis_client.ping()
+            await client.ping()
+            _redis_client = client
             logger.info("✅ Redis connection established")
         except Exception as e:
-            logger.warning(f"Redis connection failed: {e}. Caching disabled.")
-            _redis_client = None
+            logger.warning(f"Redis connection failed: {e}. Caching disabled for {REDIS_RETRY_INTERVAL}s.")
+            if client is not None:
+                try:
+                    await client.aclose()
+                except Exception:
+                    pass
             return None
     
     return _redis_client
 
 
+async def close_redis_client():
+    """Close the Redis connection pool (called on application shutdown)."""
+    global _redis_client
+    
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
+
+
 def generate_cache_key(prefix: str, **kwargs) -> str:
     """Generate a cache key from parameters."""
-    # Sort kwargs to ensure consistent keys
-    sorted_params = sorted(kwargs.items())
-    params_str = json.dumps(sorted_params, sort_keys=True)
-    params_hash = hashlib.md5(params_str.encode()).hexdigest()[:8]
+    # Sorted, compact JSON so argument order never changes the key; orjson
+    # encodes straight to bytes, skipping the str -> bytes round trip
+    params_bytes = orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS)
+    # 128-bit digest; the old 32-bit md5 prefix could collide across searches
+    params_hash = hashlib.blake2b(params_bytes, digest_size=16).hexdigest()
     return f"{prefix}:{params_hash}"
 
 
 async def get_cached(key: str) -> Optional[Any]:
     """Get value from cache."""
-    client = get_redis_client()
+    client = await get_redis_client()
     if not client:
         return None
     
     try:
-        value = client.get(key)
+        value = await client.get(key)
         if value:
-            return json.loads(value)
+            return orjson.loads(value)
     except Exception as e:
         logger.warning(f"Cache get error: {e}")
     
@@ -73,12 +98,12 @@ async def get_cached(key: str) -> Optional[Any]:
 
 async def set_cached(key: str, value: Any, ttl: int = 300) -> bool:
     """Set value in cache with TTL (default 5 minutes)."""
-    client = get_redis_client()
+    client = await get_redis_client()
     if not client:
         return False
     
     try:
-        client.setex(key, ttl, json.dumps(value))
+        await client.setex(key, ttl, orjson.dumps(value))
         return True
     except Exception as e:
         logger.warning(f"Cache set error: {e}")
@@ -87,12 +112,12 @@ async def set_cached(key: str, value: Any, ttl: int = 300) -> bool:
 
 async def delete_cached(key: str) -> bool:
     """Delete value from cache."""
-    client = get_redis_client()
+    client = await get_redis_client()
     if not client:
         return False
     
     try:
-        client.delete(key)
+        await client.delete(key)
         return True
     except Exception as e:
         logger.warning(f"Cache delete error: {e}")
@@ -101,16 +126,15 @@ async def delete_cached(key: str) -> bool:
 
 async def clear_cache_pattern(pattern: str) -> int:
     """Clear all cache keys matching pattern."""
-    client = get_redis_client()
+    client = await get_redis_client()
     if not client:
         return 0
     
     try:
-        keys = client.keys(pattern)
+        keys = await client.keys(pattern)
         if keys:
-            return client.delete(*keys)
+            return await client.delete(*keys)
         return 0
     except Exception as e:
         logger.warning(f"Cache clear error: {e}")
         return 0
-
@@ -17,6 +17,11 @@ ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 API_PORT = int(os.getenv("PORT", 8001))
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 APP_NAME = os.getenv("APP_NAME", "FlyMind")
+# Worker processes; the same default (2) is used by api/Dockerfile, api/railway.json
+# and api/docker-compose.yml
+WORKERS = int(os.getenv("WORKERS", "2"))
+# Per-request uvicorn access log lines (off by default; the app logs searches itself)
+ACCESS_LOG = os.getenv("ACCESS_LOG", "false").lower() == "true"
 
 # CORS Configuration
 ALLOWED_ORIGINS_STR = os.getenv("ALLOWED_ORIGINS", "*")
@@ -34,21 +39,73 @@ REQUIRE_API_KEY = os.getenv("REQUIRE_API_KEY", "false").lower() == "true"
 RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
 RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
 RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
+# Most client IPs tracked in memory per worker (least recently seen are dropped)
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+
+# Concurrent scrapes (each drives a Chromium instance) across all worker processes
+SEARCH_MAX_BROWSERS = int(os.getenv("SEARCH_MAX_BROWSERS", "8"))
+# Flight search thread pool per worker (scrapes are blocking and run off the event loop);
+# defaults to an even share of SEARCH_MAX_BROWSERS, so the host total stays bounded
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", max(1, SEARCH_MAX_BROWSERS // WORKERS)))
+# Scrapes running or queued per worker before /search answers 503
+SEARCH_MAX_PENDING = int(os.getenv("SEARCH_MAX_PENDING", "32"))
 
 # Database Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./flymind.db")
+# Connection pool per worker (server databases only; SQLite keeps SQLAlchemy's defaults)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))  # seconds
+# Search history older than this many days is deleted (0, the default, keeps everything)
+SEARCH_HISTORY_RETENTION_DAYS = int(os.getenv("SEARCH_HISTORY_RETENTION_DAYS", "0"))
+# Seconds between search history prunes while retention is enabled
+SEARCH_HISTORY_PRUNE_INTERVAL = int(os.getenv("SEARCH_HISTORY_PRUNE_INTERVAL", "3600"))
 
 # Redis Configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 REDIS_ENABLED = os.getenv("REDIS_ENABLED", "false").lower() == "true"
+# Seconds to wait for a Redis connection, and to wait after a failed one before retrying
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+REDIS_RETRY_INTERVAL = int(os.getenv("REDIS_RETRY_INTERVAL", "30"))
+
+# Flight search cache TTLs (seconds); empty results get a short TTL so
+# transient scrape failures are not cached for long
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_NEGATIVE_CACHE_TTL = int(os.getenv("SEARCH_NEGATIVE_CACHE_TTL", "30"))
+
+# Webhooks: maximum concurrent deliveries per fan-out
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "20"))
+# Seconds each worker reuses its list of active webhooks before re-reading the database
+WEBHOOK_CACHE_TTL = int(os.getenv("WEBHOOK_CACHE_TTL", "30"))
 
 # AI API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", None)
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", None)
 
+# AI providers: maximum concurrent outbound calls per provider (per worker),
+# e.g. OPENAI_MAX_CONCURRENCY=4
+AI_MAX_CONCURRENCY = {
+    provider: int(os.getenv(f"{provider.upper()}_MAX_CONCURRENCY", "8"))
+    for provider in ("openai", "google", "deepseek")
+}
+
+# Seconds before a single AI provider call is abandoned
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "20"))
+# Retries (with exponential backoff) when a provider answers 429 or 5xx
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+
+# Append few-shot examples to the AI parsing prompt (more tokens per call)
+AI_PROMPT_EXAMPLES = os.getenv("AI_PROMPT_EXAMPLES", "false").lower() == "true"
+
+# Seconds to reuse an AI-parsed query for identical query text (0 disables)
+AI_QUERY_CACHE_TTL = int(os.getenv("AI_QUERY_CACHE_TTL", "600"))
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+# Log a full traceback for 1 in N repeats of the same unhandled exception
+LOG_EXCEPTION_SAMPLE_RATE = int(os.getenv("LOG_EXCEPTION_SAMPLE_RATE", "100"))
 
 # External Services
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", None)
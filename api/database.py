@@ -3,20 +3,52 @@ Database setup and models for persistent storage.
 Uses SQLAlchemy with SQLite for development, PostgreSQL for production.
 """
 
-from sqlalchemy import create_engine, Column, String, Integer, Float, DateTime, Text, JSON, Boolean
+from sqlalchemy import create_engine, text, Column, String, Integer, Float, DateTime, Text, JSON, Boolean, Index
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
-from api.config import DATABASE_URL
+import time
+import orjson
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from api.config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    WEBHOOK_CACHE_TTL
+)
+from api.logger import logger
 
 # Create base class for models
 Base = declarative_base()
 
+
+def _json_serializer(value) -> str:
+    """Encode JSON columns with orjson; dates and datetimes become ISO strings."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 # Database engine
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+if "sqlite" in DATABASE_URL:
+    _engine_options = {"connect_args": {"check_same_thread": False}}
+else:
+    # Explicit pool bounds; pre-ping drops connections the server closed while idle
+    _engine_options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
 
-# Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(
+    DATABASE_URL,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+    **_engine_options
+)
+
+# Session factory; objects keep their loaded values after commit, so
+# create_* helpers can return the new row without a refresh SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
 # Database Models
@@ -36,7 +68,8 @@ class SearchHistory(Base):
     request_data = Column(JSON, nullable=True)
     result_data = Column(JSON, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Indexed for prune_search_history's range delete
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 class PriceAlert(Base):
@@ -59,6 +92,16 @@ class PriceAlert(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
+    # Serves get_all_active_alerts (newest first) without scanning
+    # soft-deleted alerts; partial on PostgreSQL and SQLite
+    __table_args__ = (
+        Index(
+            "ix_price_alerts_active_created_at", created_at.desc(),
+            postgresql_where=(status == "active") & deleted_at.is_(None),
+            sqlite_where=(status == "active") & deleted_at.is_(None)
+        ),
+    )
+
 
 class Webhook(Base):
     """Model for storing webhook URLs."""
@@ -71,10 +114,35 @@ class Webhook(Base):
     last_used_at = Column(DateTime, nullable=True)
 
 
+# Indexes replaced by newer ones; init_db drops them from existing databases
+_RETIRED_INDEXES = ("ix_price_alerts_status_deleted_at",)
+
+
 # Database initialization
-def init_db():
-    """Initialize database tables."""
-    Base.metadata.create_all(bind=engine)
+def init_db(attempts: int = 3):
+    """
+    Initialize database tables.
+
+    Every worker process runs this on startup. Two workers can both see a
+    table or index missing and both try to create it; the loser's error is
+    retried, and the retry finds the object and skips it.
+    """
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=engine)
+            # create_all skips indexes on tables that already exist, so add any missing ones
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=engine, checkfirst=True)
+            with engine.begin() as conn:
+                for index_name in _RETIRED_INDEXES:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+            return
+        except DBAPIError as e:
+            if attempt == attempts - 1:
+                raise
+            logger.warning(f"Database initialization raced another worker, retrying: {e}")
+            time.sleep(0.1 * (attempt + 1))
 
 
 # Dependency for getting database session
@@ -93,10 +161,9 @@ def get_search_history(db, search_id: str):
     return db.query(SearchHistory).filter(SearchHistory.id == search_id).first()
 
 
-def create_search_history(db, search_id: str, request_data: dict, result_data: dict):
-    """Create new search history entry."""
-    search = SearchHistory(
-        id=search_id,
+def create_search_history(db, search_id: str, request_data: dict, result_data: dict, **columns):
+    """Create new search history entry. columns override values taken from request_data."""
+    fields = dict(
         origin=request_data.get("origin", ""),
         destination=request_data.get("destination", ""),
         depart_date=request_data.get("depart_date", ""),
@@ -105,16 +172,36 @@ def create_search_history(db, search_id: str, request_data: dict, result_data: d
         children=request_data.get("children", 0),
         seat_class=request_data.get("seat_class", "economy"),
         fetch_mode=request_data.get("fetch_mode", "local"),
-        request_data=request_data,
-        result_data=result_data,
         timestamp=datetime.utcnow()
     )
+    fields.update(columns)
+    search = SearchHistory(id=search_id, request_data=request_data, result_data=result_data, **fields)
     db.add(search)
     db.commit()
-    db.refresh(search)
     return search
 
 
+def persist_search_history(session_factory, search_id: str, request_data: dict, result_data: dict, **columns):
+    """Store search history in its own short-lived session, for use as a background task."""
+    db = session_factory()
+    try:
+        create_search_history(db, search_id, request_data, result_data, **columns)
+    except Exception as e:
+        logger.error(f"Failed to store search history {search_id}: {e}")
+    finally:
+        db.close()
+
+
+def prune_search_history(db, retention_days: int) -> int:
+    """Delete search history older than retention_days. Returns rows deleted."""
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = db.query(SearchHistory).filter(SearchHistory.created_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
 def get_price_alert(db, alert_id: str):
     """Get price alert by ID."""
     return db.query(PriceAlert).filter(PriceAlert.alert_id == alert_id).first()
@@ -125,16 +212,20 @@ def create_price_alert(db, alert_data: dict):
     alert = PriceAlert(**alert_data)
     db.add(alert)
     db.commit()
-    db.refresh(alert)
     return alert
 
 
-def get_all_active_alerts(db):
-    """Get all active price alerts."""
-    return db.query(PriceAlert).filter(
+def get_all_active_alerts(db, limit: Optional[int] = None, offset: int = 0):
+    """Get active price alerts, newest first (one page if limit is given)."""
+    query = db.query(PriceAlert).filter(
         PriceAlert.status == "active",
         PriceAlert.deleted_at.is_(None)
-    ).all()
+    ).order_by(PriceAlert.created_at.desc())
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 
 def get_webhook(db, url: str):
@@ -147,7 +238,7 @@ def create_webhook(db, webhook_id: str, url: str):
     webhook = Webhook(id=webhook_id, url=url, active=True)
     db.add(webhook)
     db.commit()
-    db.refresh(webhook)
+    invalidate_webhook_cache()
     return webhook
 
 
@@ -155,3 +246,54 @@ def get_all_webhooks(db):
     """Get all active webhooks."""
     return db.query(Webhook).filter(Webhook.active == True).all()
 
+
+# (loaded_at, [(id, url), ...]) of active webhooks, shared by requests in this worker
+_webhook_cache: Optional[Tuple[float, List[Tuple[str, str]]]] = None
+
+
+def get_active_webhooks_cached(db) -> List[Tuple[str, str]]:
+    """
+    Get (id, url) pairs of active webhooks, re-reading the table at most
+    every WEBHOOK_CACHE_TTL seconds. Other workers see changes once their
+    copy expires.
+    """
+    global _webhook_cache
+    now = time.monotonic()
+    if _webhook_cache is None or now - _webhook_cache[0] >= WEBHOOK_CACHE_TTL:
+        rows = db.query(Webhook.id, Webhook.url).filter(Webhook.active == True).all()
+        _webhook_cache = (now, [(webhook_id, url) for webhook_id, url in rows])
+    return _webhook_cache[1]
+
+
+def invalidate_webhook_cache():
+    """Drop this worker's cached webhook list after a registration change."""
+    global _webhook_cache
+    _webhook_cache = None
+
+
+def touch_webhooks(db, webhook_ids):
+    """Set last_used_at on the given webhooks in one UPDATE and commit."""
+    if not webhook_ids:
+        return 0
+    updated = db.query(Webhook).filter(Webhook.id.in_(webhook_ids)).update(
+        {Webhook.last_used_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    return updated
+
+
+def persist_webhook_usage(session_factory, webhook_ids):
+    """Run touch_webhooks in its own short-lived session, for use as a background task."""
+    db = session_factory()
+    try:
+        touch_webhooks(db, webhook_ids)
+    except Exception as e:
+        logger.error(f"Failed to update webhook last_used_at: {e}")
+    finally:
+        db.close()
+
+
+def get_active_webhook_urls(db):
+    """Get URLs of all active webhooks without loading full rows."""
+    return [url for (url,) in db.query(Webhook.url).filter(Webhook.active == True)]
+
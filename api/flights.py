@@ -33,10 +33,22 @@ Usage:
         print()
 """
 
-import re
 import json
-from typing import Literal, Optional, Dict, Any, List, Union
-from fast_flights import FlightData, Passengers, create_filter, get_flights_from_filter
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Literal, Optional, Dict, Any, List, Tuple, Union
+try:
+    from fast_flights import FlightData, Passengers, create_filter, get_flights_from_filter
+    FAST_FLIGHTS_AVAILABLE = True
+except ImportError:
+    # Validation and caching still load without the scraper; searches then
+    # fail with FlightSearchError
+    FAST_FLIGHTS_AVAILABLE = False
+
+    def get_flights_from_filter(*args, **kwargs):
+        raise RuntimeError("fast_flights is not installed")
 
 
 class FlightSearchError(Exception):
@@ -44,14 +56,50 @@ class FlightSearchError(Exception):
     pass
 
 
+# Recent successful results, so repeated identical searches skip the scrape.
+# Keyed on the normalized search parameters; failures are never cached.
+RESULT_CACHE_TTL = 600  # seconds
+RESULT_CACHE_MAXSIZE = 1024
+_result_cache: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+
+def _get_cached_result(key: Tuple) -> Any:
+    """Return a cached result for key, or None if missing or expired."""
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= RESULT_CACHE_TTL:
+            del _result_cache[key]
+            return None
+        _result_cache.move_to_end(key)
+        return entry[1]
+
+
+def _set_cached_result(key: Tuple, result: Any) -> None:
+    """Store result for key, evicting the least recently used entry when full."""
+    with _result_cache_lock:
+        _result_cache[key] = (time.monotonic(), result)
+        _result_cache.move_to_end(key)
+        if len(_result_cache) > RESULT_CACHE_MAXSIZE:
+            _result_cache.popitem(last=False)
+
+
 def validate_airport_code(code: str) -> bool:
-    """Validate airport code format (3 letters)"""
-    return bool(re.match(r'^[A-Z]{3}$', code))
+    """Validate airport code format (3 uppercase letters)"""
+    return len(code) == 3 and code.isascii() and code.isalpha() and code.isupper()
 
 
 def validate_date(date_str: str) -> bool:
-    """Validate date format (YYYY-MM-DD)"""
-    return bool(re.match(r'^\d{4}-\d{2}-\d{2}$', date_str))
+    """Validate date format (YYYY-MM-DD) and that it is a real calendar date"""
+    if len(date_str) != 10 or date_str[4] != '-' or date_str[7] != '-':
+        return False
+    try:
+        date.fromisoformat(date_str)
+    except ValueError:
+        return False
+    return True
 
 
 def search_flights(
@@ -90,6 +138,42 @@ def search_flights(
     Raises:
         FlightSearchError: If validation fails or search encounters an error
     """
+    result, _ = _search(
+        origin, destination, depart_date, return_date, adults, children,
+        infants_in_seat, infants_on_lap, seat, max_stops, fetch_mode, with_url=False
+    )
+    return result
+
+
+def search_flights_with_url(
+    origin: str,
+    destination: str,
+    depart_date: str,
+    return_date: Optional[str] = None,
+    adults: int = 1,
+    children: int = 0,
+    infants_in_seat: int = 0,
+    infants_on_lap: int = 0,
+    seat: Literal["economy", "premium-economy", "business", "first"] = "economy",
+    max_stops: Optional[int] = None,
+    fetch_mode: Literal["common", "fallback", "force-fallback", "local", "bright-data"] = "common"
+) -> Tuple[Any, str]:
+    """
+    Search for flights and build the matching Google Flights URL from one filter.
+
+    Same arguments and errors as search_flights(). Returns (result, url).
+    """
+    return _search(
+        origin, destination, depart_date, return_date, adults, children,
+        infants_in_seat, infants_on_lap, seat, max_stops, fetch_mode, with_url=True
+    )
+
+
+def _search(
+    origin, destination, depart_date, return_date, adults, children,
+    infants_in_seat, infants_on_lap, seat, max_stops, fetch_mode, with_url: bool
+) -> Tuple[Any, Optional[str]]:
+    """Validate, then serve from the result cache or scrape; optionally build the URL."""
     # Input validation
     if not validate_airport_code(origin.upper()):
         raise FlightSearchError(f"Invalid origin airport code: {origin}")
@@ -109,6 +193,45 @@ def search_flights(
     origin = origin.upper()
     destination = destination.upper()
 
+    # force-fallback explicitly asks for a fresh fetch
+    use_cache = fetch_mode != "force-fallback"
+    cache_key = (
+        origin, destination, depart_date, return_date, adults, children,
+        infants_in_seat, infants_on_lap, seat, max_stops, fetch_mode
+    )
+    result = _get_cached_result(cache_key) if use_cache else None
+
+    # The filter is only needed to scrape or to build the URL
+    filter = None
+    if result is None or with_url:
+        filter = _build_filter(
+            origin, destination, depart_date, return_date, adults, children,
+            infants_in_seat, infants_on_lap, seat, max_stops
+        )
+
+    if result is None:
+        # Get flights with error handling
+        try:
+            result = get_flights_from_filter(filter, mode=fetch_mode)
+        except RuntimeError as e:
+            raise FlightSearchError(f"Flight search failed: {str(e)}")
+        except Exception as e:
+            raise FlightSearchError(f"Unexpected error during flight search: {str(e)}")
+
+        if use_cache and result is not None:
+            _set_cached_result(cache_key, result)
+
+    return result, (_filter_url(filter) if with_url else None)
+
+
+def _build_filter(
+    origin, destination, depart_date, return_date, adults, children,
+    infants_in_seat, infants_on_lap, seat, max_stops
+):
+    """Build the Google Flights filter shared by searches and URLs."""
+    if not FAST_FLIGHTS_AVAILABLE:
+        raise FlightSearchError("fast_flights is not installed")
+
     # Determine trip type
     trip = "one-way" if return_date is None else "round-trip"
 
@@ -131,7 +254,7 @@ def search_flights(
     )
 
     # Create filter
-    filter = create_filter(
+    return create_filter(
         flight_data=flight_data,
         trip=trip,
         seat=seat,
@@ -139,14 +262,12 @@ def search_flights(
         max_stops=max_stops
     )
 
-    # Get flights with error handling
-    try:
-        result = get_flights_from_filter(filter, mode=fetch_mode)
-        return result
-    except RuntimeError as e:
-        raise FlightSearchError(f"Flight search failed: {str(e)}")
-    except Exception as e:
-        raise FlightSearchError(f"Unexpected error during flight search: {str(e)}")
+
+def _filter_url(filter) -> str:
+    """Google Flights URL for a filter."""
+    # Get Base64 encoded string
+    b64 = filter.as_b64().decode('utf-8')
+    return f"https://www.google.com/travel/flights?tfs={b64}"
 
 
 def get_flights_url(
@@ -170,44 +291,15 @@ def get_flights_url(
     Returns:
         str: Google Flights URL
     """
-    # Determine trip type
-    trip = "one-way" if return_date is None else "round-trip"
-
-    # Create flight data
-    flight_data = [
-        FlightData(date=depart_date, from_airport=origin, to_airport=destination)
-    ]
-
-    if return_date:
-        flight_data.append(
-            FlightData(date=return_date, from_airport=destination, to_airport=origin)
-        )
-
-    # Create passengers
-    passengers = Passengers(
-        adults=adults,
-        children=children,
-        infants_in_seat=infants_in_seat,
-        infants_on_lap=infants_on_lap
-    )
-
-    # Create filter
-    filter = create_filter(
-        flight_data=flight_data,
-        trip=trip,
-        seat=seat,
-        passengers=passengers,
-        max_stops=max_stops
-    )
-
-    # Get Base64 encoded string
-    b64 = filter.as_b64().decode('utf-8')
-    return f"https://www.google.com/travel/flights?tfs={b64}"
+    return _filter_url(_build_filter(
+        origin, destination, depart_date, return_date, adults, children,
+        infants_in_seat, infants_on_lap, seat, max_stops
+    ))
 
 
 if __name__ == "__main__":
     # Search for flights from Nairobi to Stockholm on Dec 25, 2025
-    result = search_flights(
+    result, url = search_flights_with_url(
         origin="NBO",
         destination="ARN",
         depart_date="2025-12-25",
@@ -217,6 +309,7 @@ if __name__ == "__main__":
         fetch_mode="local"
     )
 
+    print(f"Google Flights: {url}")
     print(f"Current price level: {result.current_price}")
     print(f"Found {len(result.flights)} flights")
     print("\nFirst 5 flights:")
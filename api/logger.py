@@ -2,41 +2,90 @@
 Structured logging configuration for FlyMind API.
 """
 
+import atexit
+import copy
 import logging
-import json
+import queue
 import sys
 from datetime import datetime
-from typing import Any, Dict
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+import orjson
 from api.config import LOG_LEVEL, LOG_FORMAT
 
+# Background listener that writes queued records, so request handlers never
+# block on stdout
+_queue_listener: Optional[QueueListener] = None
+
 
 class JSONFormatter(logging.Formatter):
     """Custom formatter that outputs JSON logs."""
     
     def format(self, record: logging.LogRecord) -> str:
+        # Queued records arrive with their arguments already merged into msg
+        msg = record.msg
+        if record.args or not isinstance(msg, str):
+            msg = record.getMessage()
+
         log_data: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # Serialized by orjson in C (naive UTC rendered with a Z suffix)
+            "timestamp": datetime.utcnow(),
             "level": record.levelname,
             "logger": record.name,
-            "message": record.getMessage(),
+            "message": msg,
             "module": record.module,
             "function": record.funcName,
             "line": record.lineno,
         }
         
-        # Add exception info if present
+        # Add exception info if present (pre-rendered when the record was queued)
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_data["exception"] = record.exc_text
         
         # Add extra fields if present
-        if hasattr(record, "extra"):
-            log_data.update(record.extra)
+        extra = record.__dict__.get("extra")
+        if extra:
+            log_data.update(extra)
         
-        return json.dumps(log_data)
+        # default=str keeps unusual extra values from breaking the log line
+        return orjson.dumps(
+            log_data, default=str, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+        ).decode()
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that keeps records structured for the listener's formatter.
+
+    The stock QueueHandler formats the whole record into its message; here only
+    the message arguments are merged and the traceback is rendered to exc_text,
+    so JSONFormatter still emits separate "message" and "exception" fields.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stop_queue_listener():
+    """Flush and stop the background log listener."""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
 
 
 def setup_logging():
     """Configure logging for the application."""
+    global _queue_listener
+    
     # Get root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
@@ -58,13 +107,20 @@ def setup_logging():
         )
     
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    
+    # Route records through a queue; a listener thread does the actual I/O
+    _stop_queue_listener()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+    _queue_listener.start()
+    root_logger.addHandler(_NonBlockingQueueHandler(log_queue))
     
     return root_logger
 
 
 # Setup logging on import
 setup_logging()
+atexit.register(_stop_queue_listener)
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -5,16 +5,80 @@ Middleware for authentication, rate limiting, and security.
 from fastapi import Request, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Callable, Dict
+from typing import Callable, Dict, Tuple
+import hmac
 import time
-from collections import defaultdict
+from collections import OrderedDict
 from api.config import (
     API_KEY, REQUIRE_API_KEY, API_KEY_HEADER,
-    RATE_LIMIT_ENABLED, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW
+    RATE_LIMIT_ENABLED, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_MAX_CLIENTS
 )
+from api.cache import get_redis_client
+from api.logger import logger
 
-# Rate limiting storage (in-memory, will be replaced with Redis later)
-rate_limit_storage: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "reset_time": 0})
+# Paths served without authentication or rate limiting
+_PUBLIC_PATHS = frozenset({"/health", "/", "/docs", "/redoc", "/openapi.json"})
+
+
+def _is_public_path(request: Request) -> bool:
+    """Whether the request targets a public path (reads the raw ASGI path, no URL parsing)."""
+    return request.scope["path"] in _PUBLIC_PATHS
+
+# Rate limiting storage (in-memory fallback when Redis is disabled or unreachable),
+# ordered from least to most recently seen client
+rate_limit_storage: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+
+
+def _count_request_locally(client_ip: str, current_time: float) -> Tuple[int, float]:
+    """Count a request in this worker's window. Returns (count, reset_time)."""
+    client_data = rate_limit_storage.get(client_ip)
+    if client_data is None:
+        client_data = rate_limit_storage[client_ip] = {"count": 0, "reset_time": 0}
+    else:
+        rate_limit_storage.move_to_end(client_ip)
+    
+    # Drop clients whose window has expired from the stale end, then enforce
+    # the size cap, so rotating IPs can't grow the table without bound
+    while rate_limit_storage:
+        oldest_ip, oldest = next(iter(rate_limit_storage.items()))
+        if oldest_ip == client_ip:
+            break
+        if oldest["reset_time"] >= current_time and len(rate_limit_storage) <= RATE_LIMIT_MAX_CLIENTS:
+            break
+        del rate_limit_storage[oldest_ip]
+    
+    # Reset if window expired
+    if current_time > client_data["reset_time"]:
+        client_data["count"] = 0
+        client_data["reset_time"] = current_time + RATE_LIMIT_WINDOW
+    
+    # Every request counts, rejected ones included, as with the Redis INCR path
+    client_data["count"] += 1
+    return client_data["count"], client_data["reset_time"]
+
+
+async def _count_request(client_ip: str) -> Tuple[int, float]:
+    """
+    Count a request against the client's window. Returns (count, reset_time).
+
+    Uses a Redis counter shared by all workers when Redis is available, so
+    the limit applies per deployment rather than per worker process.
+    """
+    current_time = time.time()
+    client = await get_redis_client()
+    if client:
+        key = f"ratelimit:{client_ip}"
+        try:
+            # One round trip: start the window if absent, count, read its TTL
+            pipe = client.pipeline(transaction=True)
+            pipe.set(key, 0, ex=RATE_LIMIT_WINDOW, nx=True)
+            pipe.incr(key)
+            pipe.ttl(key)
+            _, count, ttl = await pipe.execute()
+            return count, current_time + max(ttl, 0)
+        except Exception as e:
+            logger.warning(f"Redis rate limit error: {e}. Falling back to in-memory counters.")
+    return _count_request_locally(client_ip, current_time)
 
 
 class APIKeyMiddleware(BaseHTTPMiddleware):
@@ -24,15 +88,19 @@ class APIKeyMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next: Callable):
         # Skip authentication for health check and docs endpoints
-        if request.url.path in ["/health", "/", "/docs", "/redoc", "/openapi.json"]:
+        if _is_public_path(request):
             return await call_next(request)
         
         # If API key is required and configured
         if REQUIRE_API_KEY and API_KEY:
             # Get API key from header
-            api_key = request.headers.get(API_KEY_HEADER) or request.headers.get("Authorization", "").replace("Bearer ", "")
+            api_key = request.headers.get(API_KEY_HEADER)
+            if not api_key:
+                authorization = request.headers.get("Authorization", "")
+                api_key = authorization[7:] if authorization.startswith("Bearer ") else ""
             
-            if not api_key or api_key != API_KEY:
+            # Constant-time comparison so response timing doesn't leak the key
+            if not api_key or not hmac.compare_digest(api_key.encode(), API_KEY.encode()):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid or missing API key. Provide API key in X-API-Key header."
@@ -48,7 +116,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next: Callable):
         # Skip rate limiting for health check and docs
-        if request.url.path in ["/health", "/", "/docs", "/redoc", "/openapi.json"]:
+        if _is_public_path(request):
             return await call_next(request)
         
         if not RATE_LIMIT_ENABLED:
@@ -57,30 +125,19 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         # Get client IP
         client_ip = request.client.host if request.client else "unknown"
         
-        # Check rate limit
-        current_time = time.time()
-        client_data = rate_limit_storage[client_ip]
-        
-        # Reset if window expired
-        if current_time > client_data["reset_time"]:
-            client_data["count"] = 0
-            client_data["reset_time"] = current_time + RATE_LIMIT_WINDOW
-        
-        # Check if limit exceeded
-        if client_data["count"] >= RATE_LIMIT_REQUESTS:
+        # Count this request and check the limit
+        count, reset_time = await _count_request(client_ip)
+        if count > RATE_LIMIT_REQUESTS:
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail=f"Rate limit exceeded. Maximum {RATE_LIMIT_REQUESTS} requests per {RATE_LIMIT_WINDOW} seconds."
             )
         
-        # Increment counter
-        client_data["count"] += 1
-        
         # Add rate limit headers
         response = await call_next(request)
         response.headers["X-RateLimit-Limit"] = str(RATE_LIMIT_REQUESTS)
-        response.headers["X-RateLimit-Remaining"] = str(RATE_LIMIT_REQUESTS - client_data["count"])
-        response.headers["X-RateLimit-Reset"] = str(int(client_data["reset_time"]))
+        response.headers["X-RateLimit-Remaining"] = str(RATE_LIMIT_REQUESTS - count)
+        response.headers["X-RateLimit-Reset"] = str(int(reset_time))
         
         return response
 
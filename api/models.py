@@ -2,13 +2,28 @@
 Pydantic models for request/response validation.
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+from typing import Annotated, List, Optional, Dict, Any, Literal
 from datetime import date
+from api.services import parse_flexible_date
+
+
+def _flexible_date(value: Any) -> Any:
+    """Resolve flexible date strings; anything else is left to date validation."""
+    if isinstance(value, str):
+        return parse_flexible_date(value)
+    return value
+
+
+# A date given as YYYY-MM-DD or a flexible string ("weekend", "+3 days"),
+# resolved once while the request is validated
+FlexibleDate = Annotated[date, BeforeValidator(_flexible_date)]
 
 
 class FlightResult(BaseModel):
     """Flight result model optimized for n8n workflows"""
+    model_config = ConfigDict(frozen=True)
+
     name: str = Field(..., description="Airline and flight number")
     departure: str = Field(..., description="Departure time and date")
     arrival: str = Field(..., description="Arrival time and date")
@@ -20,6 +35,8 @@ class FlightResult(BaseModel):
 
 class SearchResponse(BaseModel):
     """Search response model for n8n compatibility"""
+    model_config = ConfigDict(frozen=True)
+
     success: bool = Field(..., description="Whether the search was successful")
     current_price: str = Field(..., description="Current price level")
     total_flights: int = Field(..., description="Total number of flights found")
@@ -32,6 +49,8 @@ class SearchResponse(BaseModel):
 
 class ErrorResponse(BaseModel):
     """Error response model for n8n workflows"""
+    model_config = ConfigDict(frozen=True)
+
     success: bool = Field(default=False, description="Always false for errors")
     error: str = Field(..., description="Error message")
     error_code: str = Field(..., description="Error code for programmatic handling")
@@ -47,13 +66,13 @@ class FlightSegment(BaseModel):
 
 class FlightSearchRequest(BaseModel):
     """Flight search request model with multi-city and flexible dates support"""
-    trip_type: str = Field("round-trip", description="Trip type: round-trip, one-way, multi-city")
+    trip_type: Literal["round-trip", "one-way", "multi-city"] = Field("round-trip", description="Trip type: round-trip, one-way, multi-city")
     segments: Optional[List[FlightSegment]] = Field(None, description="Flight segments for multi-city trips")
     # Legacy fields for backward compatibility
     origin: Optional[str] = Field(None, description="Departure city or airport code")
     destination: Optional[str] = Field(None, description="Arrival city or airport code")
-    depart_date: Optional[Union[date, str]] = Field(None, description="Departure date (YYYY-MM-DD) or flexible date")
-    return_date: Optional[Union[date, str]] = Field(None, description="Return date (YYYY-MM-DD) or flexible date")
+    depart_date: Optional[FlexibleDate] = Field(None, description="Departure date (YYYY-MM-DD) or flexible date")
+    return_date: Optional[FlexibleDate] = Field(None, description="Return date (YYYY-MM-DD) or flexible date")
     adults: int = Field(1, description="Number of adult passengers", ge=1, le=9)
     children: int = Field(0, description="Number of children", ge=0, le=8)
     infants_seat: int = Field(0, description="Number of infants in seat", ge=0, le=4)
@@ -62,27 +81,16 @@ class FlightSearchRequest(BaseModel):
     max_stops: Optional[int] = Field(None, description="Maximum stops", ge=0, le=2)
     fetch_mode: str = Field("local", description="Fetch mode")
 
-    @validator('trip_type')
-    def validate_trip_type(cls, v):
-        if v not in ['round-trip', 'one-way', 'multi-city']:
-            raise ValueError('Invalid trip type')
-        return v
-
     def get_segments(self) -> List[FlightSegment]:
         """Get flight segments based on trip type"""
-        from api.services import parse_flexible_date
-        
         if self.trip_type == "multi-city" and self.segments:
             return self.segments
         elif self.trip_type in ["round-trip", "one-way"] and self.origin and self.destination and self.depart_date:
-            # Parse flexible dates
-            depart_date_parsed = parse_flexible_date(self.depart_date)
-
             # For backward compatibility, only return the outbound segment
             segments = [FlightSegment(
                 origin=self.origin,
                 destination=self.destination,
-                depart_date=depart_date_parsed
+                depart_date=self.depart_date
             )]
             return segments
         else:
@@ -99,31 +107,21 @@ class WebhookPayload(BaseModel):
 
 class PriceAlertRequest(BaseModel):
     """Price alert creation request"""
-    trip_type: str = Field("one-way", description="Trip type: one-way, round-trip, multi-city")
+    trip_type: Literal["one-way", "round-trip", "multi-city"] = Field("one-way", description="Trip type: one-way, round-trip, multi-city")
     origin: str = Field(..., description="Departure city or airport code")
     destination: str = Field(..., description="Arrival city or airport code")
-    depart_date: Union[date, str] = Field(..., description="Departure date")
-    return_date: Optional[Union[date, str]] = Field(None, description="Return date for round-trip")
+    depart_date: FlexibleDate = Field(..., description="Departure date")
+    return_date: Optional[FlexibleDate] = Field(None, description="Return date for round-trip")
     target_price: float = Field(..., description="Target price to alert on", gt=0)
-    currency: str = Field("SEK", description="Currency code (SEK, USD, EUR, GBP)")
+    currency: Literal["SEK", "USD", "EUR", "GBP"] = Field("SEK", description="Currency code (SEK, USD, EUR, GBP)")
     email: str = Field(..., description="Email address for notifications")
     notification_channels: List[str] = Field(["email"], description="Notification channels")
 
-    @validator('trip_type')
-    def validate_trip_type(cls, v):
-        if v not in ['one-way', 'round-trip', 'multi-city']:
-            raise ValueError('Invalid trip type')
-        return v
-
-    @validator('currency')
-    def validate_currency(cls, v):
-        if v not in ['SEK', 'USD', 'EUR', 'GBP']:
-            raise ValueError('Invalid currency')
-        return v
-
 
 class PriceAlertResponse(BaseModel):
     """Price alert response"""
+    model_config = ConfigDict(frozen=True)
+
     alert_id: str = Field(..., description="Unique alert identifier")
     trip_type: str = Field(..., description="Trip type")
     origin: str = Field(..., description="Departure city or airport code")
@@ -141,13 +139,25 @@ class PriceAlertResponse(BaseModel):
 class NaturalLanguageQuery(BaseModel):
     """Natural language flight search query"""
     query: str = Field(..., description="Natural language flight search query", min_length=3, max_length=500)
-    provider: str = Field("openai", description="AI provider: openai, google, deepseek")
+    provider: Literal["openai", "google", "deepseek"] = Field("openai", description="AI provider: openai, google, deepseek")
     api_key: Optional[str] = Field(None, description="API key (optional if set in environment)")
     model: Optional[str] = Field(None, description="Model name (optional, uses default for provider)")
 
-    @validator('provider')
-    def validate_provider(cls, v):
-        if v not in ['openai', 'google', 'deepseek']:
-            raise ValueError('Invalid AI provider')
-        return v
 
+
+class ParsedFlightQuery(BaseModel):
+    """Flight search parameters extracted from a natural language query by an AI provider"""
+    model_config = ConfigDict(extra="ignore")
+
+    origin: Optional[str] = Field(None, description="Departure city or airport code")
+    destination: Optional[str] = Field(None, description="Arrival city or airport code")
+    depart_date: Optional[str] = Field(None, description="Departure date (YYYY-MM-DD) or flexible date")
+    return_date: Optional[str] = Field(None, description="Return date, or null for one-way")
+    trip_type: Optional[str] = Field(None, description="Trip type: one-way, round-trip, multi-city")
+    adults: int = Field(1, description="Number of adult passengers")
+    children: int = Field(0, description="Number of children")
+    seat_class: str = Field("economy", description="Seat class")
+    max_stops: Optional[int] = Field(None, description="Maximum stops, null for any")
+    budget_max: Optional[float] = Field(None, description="Maximum budget, null if not specified")
+    preferred_airlines: List[str] = Field(default_factory=list, description="Preferred airline names")
+    flexible_dates: bool = Field(False, description="Whether the dates are flexible")
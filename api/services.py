@@ -2,11 +2,47 @@
 Business logic services for flight search, alerts, and utilities.
 """
 
-from typing import Optional, Literal, List
+from typing import Optional, Literal, List, Mapping, Callable, Union
+from types import MappingProxyType
 from datetime import date, timedelta
+import asyncio
+from functools import lru_cache
 import re
+from urllib.parse import urlencode
+import httpx
+import orjson
+from api.config import WEBHOOK_MAX_CONCURRENCY
 from api.logger import logger
-from api.constants import CITY_TO_AIRPORT
+from api.constants import CITY_TO_AIRPORT, AIRPORT_CODES
+
+# Relative day offsets such as "+3 days" or "-1 day"
+_FLEX_DAYS_RE = re.compile(r'^([+-])(\d+)\s*days?$')
+
+# Month names accepted by parse_flexible_date, e.g. "december"
+_MONTHS: Mapping[str, int] = MappingProxyType({
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
+})
+
+
+def _next_saturday(today: date) -> date:
+    days_until_saturday = (5 - today.weekday()) % 7
+    if days_until_saturday == 0:
+        days_until_saturday = 7  # Next Saturday if today is Saturday
+    return today + timedelta(days=days_until_saturday)
+
+
+# Keyword dates resolved relative to the base date
+_KEYWORD_DATES: Mapping[str, Callable[[date], date]] = MappingProxyType({
+    'weekend': _next_saturday,
+    'today': lambda today: today,
+})
+
+# Literal YYYY-MM-DD strings repeat across searches and alerts
+_parse_iso_date = lru_cache(maxsize=1024)(date.fromisoformat)
+
+# Airport code in parentheses, e.g. "London (LHR)"
+_AIRPORT_CODE_RE = re.compile(r'\(([a-zA-Z]{3})\)')
 
 
 def parse_flexible_date(date_input: str, base_date: Optional[date] = None) -> date:
@@ -23,24 +59,25 @@ def parse_flexible_date(date_input: str, base_date: Optional[date] = None) -> da
         return date_input
 
     if isinstance(date_input, str):
-        # Try to parse as YYYY-MM-DD first
-        try:
-            return date.fromisoformat(date_input)
-        except ValueError:
-            pass
+        # Try to parse as YYYY-MM-DD first; literal dates are memoized
+        if date_input[:1].isdigit():
+            try:
+                return _parse_iso_date(date_input)
+            except ValueError:
+                pass
 
         # Handle flexible date strings
         today = base_date or date.today()
 
-        # Weekend (next Saturday)
-        if date_input.lower() == "weekend":
-            days_until_saturday = (5 - today.weekday()) % 7
-            if days_until_saturday == 0:
-                days_until_saturday = 7  # Next Saturday if today is Saturday
-            return today + timedelta(days=days_until_saturday)
+        date_lower = date_input.lower()
+
+        # Keywords such as "weekend" (next Saturday)
+        resolve = _KEYWORD_DATES.get(date_lower)
+        if resolve is not None:
+            return resolve(today)
 
         # ±X days format
-        match = re.match(r'^([+-])(\d+)\s*days?$', date_input.lower())
+        match = _FLEX_DAYS_RE.match(date_lower)
         if match:
             sign, days = match.groups()
             days = int(days)
@@ -50,12 +87,8 @@ def parse_flexible_date(date_input: str, base_date: Optional[date] = None) -> da
                 return today - timedelta(days=days)
 
         # Month name (e.g., "december", "january")
-        month_names = {
-            'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
-            'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
-        }
-        if date_input.lower() in month_names:
-            month = month_names[date_input.lower()]
+        month = _MONTHS.get(date_lower)
+        if month is not None:
             year = today.year if month >= today.month else today.year + 1
             return date(year, month, 1)
 
@@ -67,13 +100,15 @@ def parse_flexible_date(date_input: str, base_date: Optional[date] = None) -> da
     return date.today()
 
 
+@lru_cache(maxsize=4096)
 def convert_city_to_airport(city_name: str) -> str:
     """Convert city name to airport code, or return as-is if already an airport code"""
     if not city_name:
         return city_name
 
-    # If it's already 3 characters and uppercase, assume it's an airport code
-    if len(city_name) == 3 and city_name.isupper():
+    # Known airport codes pass straight through; other 3-letter uppercase
+    # strings (e.g. "NYC") fall through to the city lookup below
+    if len(city_name) == 3 and city_name in AIRPORT_CODES:
         return city_name
 
     # Look up in city mapping
@@ -84,9 +119,9 @@ def convert_city_to_airport(city_name: str) -> str:
         return airport_code
 
     # If not found, try to extract airport code from the string (e.g., "London (LHR)" -> "LHR")
-    airport_match = re.search(r'\(([A-Z]{3})\)', city_name.upper())
+    airport_match = _AIRPORT_CODE_RE.search(city_name)
     if airport_match:
-        return airport_match.group(1)
+        return airport_match.group(1).upper()
 
     # If still not found, return the original (might be an airport code already)
     return city_name.upper()
@@ -107,42 +142,80 @@ def get_flights_url(
     """Generate Google Flights URL for search parameters"""
     base_url = "https://www.google.com/travel/flights"
 
-    # Build search parameters
-    params = [
-        f"q=flights",
-        f"origin={origin}",
-        f"destination={destination}",
-        f"departure_date={depart_date}",
-        f"adults={adults}",
-        f"children={children}",
-        f"infants_in_seat={infants_in_seat}",
-        f"infants_on_lap={infants_on_lap}",
-        f"seat={seat}"
-    ]
+    # Build search parameters; urlencode escapes non-ASCII city names
+    params = {
+        "q": "flights",
+        "origin": origin,
+        "destination": destination,
+        "departure_date": depart_date,
+        "adults": adults,
+        "children": children,
+        "infants_in_seat": infants_in_seat,
+        "infants_on_lap": infants_on_lap,
+        "seat": seat,
+    }
 
     if return_date:
-        params.append(f"return_date={return_date}")
+        params["return_date"] = return_date
+
+    if max_stops == 0:
+        params["stops"] = "nonstop"
+    elif max_stops in (1, 2):
+        params["stops"] = str(max_stops)
+
+    return f"{base_url}?{urlencode(params)}"
+
 
-    if max_stops is not None:
-        if max_stops == 0:
-            params.append("stops=nonstop")
-        elif max_stops == 1:
-            params.append("stops=1")
-        elif max_stops == 2:
-            params.append("stops=2")
+# Shared HTTP client for outbound calls (created lazily, once per worker)
+_http_client: Optional[httpx.AsyncClient] = None
 
-    return f"{base_url}?{'&'.join(params)}"
 
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared async HTTP client with connection pooling."""
+    global _http_client
 
-async def send_webhook_notification(webhook_url: str, payload: dict):
-    """Send webhook notification to external service (async)"""
-    import httpx
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=50)
+        )
+
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+_JSON_HEADERS = {"content-type": "application/json"}
+
+
+async def send_webhook_notification(webhook_url: str, payload: Union[dict, bytes]):
+    """Send webhook notification to external service (async); payload may be pre-encoded JSON bytes"""
+    body = payload if isinstance(payload, bytes) else orjson.dumps(payload)
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(webhook_url, json=payload)
-            logger.info(f"Webhook sent to {webhook_url}: {response.status_code}")
-            return response
+        response = await get_http_client().post(webhook_url, content=body, headers=_JSON_HEADERS)
+        logger.info(f"Webhook sent to {webhook_url}: {response.status_code}")
+        return response
     except Exception as e:
         logger.error(f"Failed to send webhook to {webhook_url}: {e}")
         raise
 
+
+async def fan_out_webhooks(webhook_urls: List[str], payload: dict):
+    """Send one payload to many webhooks concurrently, bounded by WEBHOOK_MAX_CONCURRENCY"""
+    semaphore = asyncio.Semaphore(WEBHOOK_MAX_CONCURRENCY)
+    # Encode once; every webhook receives the same bytes
+    body = orjson.dumps(payload)
+
+    async def send_one(webhook_url: str):
+        async with semaphore:
+            await send_webhook_notification(webhook_url, body)
+
+    # Failures are already logged per webhook; one bad endpoint must not stop the rest
+    await asyncio.gather(*(send_one(url) for url in webhook_urls), return_exceptions=True)
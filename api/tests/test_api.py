@@ -4,10 +4,24 @@ Pytest test suite for FlyMind API endpoints.
 
 import pytest
 from fastapi.testclient import TestClient
-from api.api import app
-from api.database import Base, engine, SessionLocal, init_db
+import api.api as api_module
+import api.flights as flights_module
+import api.middleware as middleware_module
+from api.api import app, normalize_search_params, cached_search, format_flights, FlightSearchResult, FlightSearchError
+from api.database import Base, engine, SessionLocal, init_db, create_search_history
 from api.models import FlightSearchRequest, PriceAlertRequest
+from api.services import convert_city_to_airport, get_flights_url
+from api.cache import generate_cache_key
+from fastapi import HTTPException
+from sqlalchemy import inspect, text
+import asyncio
+import json
 import os
+from collections import OrderedDict
+from types import SimpleNamespace
+import time
+import uuid
+from datetime import date, timedelta
 
 # Set test environment
 os.environ["ENVIRONMENT"] = "test"
@@ -180,6 +194,33 @@ def test_search_history_endpoint(client):
     assert response.status_code == 404
 
 
+def test_search_history_etag(client):
+    """Test stored searches can be revalidated with If-None-Match."""
+    search_id = f"search_{uuid.uuid4().hex}"
+    db = SessionLocal()
+    try:
+        create_search_history(db, search_id, {"origin": "JFK", "destination": "LAX", "depart_date": "2026-12-25"}, {"flights": []})
+    finally:
+        db.close()
+
+    response = client.get(f"/search/{search_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.json()["request"]["origin"] == "JFK"
+
+    response = client.get(f"/search/{search_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get(f"/search/{search_id}", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+
+    response = client.get(f"/search/{search_id}", headers={"If-None-Match": "*"})
+    assert response.status_code == 304
+
+    response = client.get(f"/search/{search_id}", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
 def test_cors_headers(client):
     """Test CORS headers are present."""
     response = client.options("/health")
@@ -198,3 +239,280 @@ def test_error_handling(client):
     assert response.status_code == 422
 
 
+def test_convert_city_to_airport():
+    """Test city name to airport code conversion."""
+    assert convert_city_to_airport("JFK") == "JFK"
+    assert convert_city_to_airport("Stockholm") == "ARN"
+    assert convert_city_to_airport("NYC") == "JFK"
+    assert convert_city_to_airport("London (lhr)") == "LHR"
+    assert convert_city_to_airport("xyz") == "XYZ"
+
+
+def test_get_flights_url_escapes_params():
+    """Test Google Flights URL parameters are URL-encoded."""
+    url = get_flights_url("São Paulo", "LAX", "2026-11-01", max_stops=0)
+    assert "origin=S%C3%A3o+Paulo" in url
+    assert "stops=nonstop" in url
+    assert "return_date" not in url
+
+
+def test_normalize_search_params():
+    """Test search params are canonicalized before cache keying."""
+    params = normalize_search_params({
+        "origin": "jfk", "destination": "LAX", "depart_date": "+3 days",
+        "return_date": None, "adults": 0, "children": 99,
+        "infants_in_seat": 0, "infants_on_lap": 0,
+    })
+    assert params["origin"] == "JFK"
+    assert params["depart_date"] == (date.today() + timedelta(days=3)).isoformat()
+    assert params["return_date"] is None
+    assert params["adults"] == 1
+    assert params["children"] == 8
+
+
+def test_generate_cache_key_ignores_param_order():
+    """Test cache keys don't depend on keyword order."""
+    assert generate_cache_key("flight_search", origin="JFK", adults=1) == \
+        generate_cache_key("flight_search", adults=1, origin="JFK")
+    assert generate_cache_key("flight_search", origin="JFK", adults=1) != \
+        generate_cache_key("flight_search", origin="JFK", adults=2)
+
+
+def _search_params(**overrides):
+    """Search params for cached_search with a unique route per test."""
+    params = {
+        "origin": "ARN", "destination": uuid.uuid4().hex[:3].upper(), "depart_date": "2026-11-01",
+        "return_date": None, "adults": 1, "children": 0, "infants_in_seat": 0,
+        "infants_on_lap": 0, "seat": "economy", "max_stops": None, "fetch_mode": "local",
+    }
+    params.update(overrides)
+    return params
+
+
+def test_cached_search_coalesces_identical_searches(monkeypatch):
+    """Test concurrent identical searches share one scrape, even if the first caller leaves."""
+    calls = []
+
+    def fake_search_flights(**params):
+        calls.append(params)
+        time.sleep(0.2)
+        return FlightSearchResult(flights=[], current_price="low")
+
+    monkeypatch.setattr(api_module, "search_flights", fake_search_flights)
+    params = _search_params()
+
+    async def run():
+        first = asyncio.ensure_future(cached_search(dict(params)))
+        await asyncio.sleep(0.05)
+        others = [asyncio.ensure_future(cached_search(dict(params))) for _ in range(4)]
+        await asyncio.sleep(0.05)
+        first.cancel()
+        results = await asyncio.gather(*others)
+        assert first.cancelled()
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result["current_price"] == "low" for result in results)
+    assert not api_module._inflight_searches
+
+
+def test_cached_search_rejects_when_pool_saturated(monkeypatch):
+    """Test searches fail fast with 503 instead of queueing behind a full scrape pool."""
+    def fake_search_flights(**params):
+        raise AssertionError("scraper should not run")
+
+    monkeypatch.setattr(api_module, "search_flights", fake_search_flights)
+
+    async def run():
+        monkeypatch.setattr(api_module, "_search_slots", asyncio.Semaphore(0))
+        with pytest.raises(HTTPException) as exc_info:
+            await cached_search(_search_params())
+        return exc_info.value
+
+    assert asyncio.run(run()).status_code == 503
+
+
+def test_cached_search_reraises_degraded_entry(monkeypatch):
+    """Test a cached scraper failure re-raises without scraping again."""
+    calls = []
+
+    async def fake_get_cached(key):
+        return {"degraded": True, "error": "Flight search failed: 429"}
+
+    monkeypatch.setattr(api_module, "get_cached", fake_get_cached)
+    monkeypatch.setattr(api_module, "search_flights", lambda **params: calls.append(params))
+
+    with pytest.raises(FlightSearchError, match="429"):
+        asyncio.run(cached_search(_search_params()))
+    assert calls == []
+
+
+def test_rate_limit_storage_evicts_stale_and_caps_size(monkeypatch):
+    """Test the in-memory rate limit table drops expired clients and stays under its cap."""
+    storage = OrderedDict()
+    monkeypatch.setattr(middleware_module, "rate_limit_storage", storage)
+    monkeypatch.setattr(middleware_module, "RATE_LIMIT_MAX_CLIENTS", 2)
+    count_request = middleware_module._count_request_locally
+    window = middleware_module.RATE_LIMIT_WINDOW
+
+    # An expired window is dropped when another client arrives
+    count_request("10.0.0.1", 0.0)
+    count_request("10.0.0.2", window + 1.0)
+    assert list(storage) == ["10.0.0.2"]
+
+    # Past the cap, the least recently seen client goes first
+    count_request("10.0.0.3", window + 1.0)
+    count_request("10.0.0.2", window + 2.0)
+    count_request("10.0.0.4", window + 2.0)
+    assert list(storage) == ["10.0.0.2", "10.0.0.4"]
+
+    # Every request counts, including ones over the limit
+    for _ in range(middleware_module.RATE_LIMIT_REQUESTS + 1):
+        count, _ = count_request("10.0.0.4", window + 3.0)
+    assert count == middleware_module.RATE_LIMIT_REQUESTS + 2
+
+
+def test_flights_result_cache(monkeypatch):
+    """Test the flights wrapper caches successes (TTL + LRU) but never failures."""
+    calls = []
+
+    def fake_get_flights_from_filter(flight_filter, mode):
+        calls.append(mode)
+        if flight_filter == "fail":
+            raise RuntimeError("blocked")
+        return f"result {len(calls)}"
+
+    monkeypatch.setattr(flights_module, "_build_filter", lambda origin, destination, *args: "fail" if origin == "BAD" else "ok")
+    monkeypatch.setattr(flights_module, "get_flights_from_filter", fake_get_flights_from_filter)
+    monkeypatch.setattr(flights_module, "_result_cache", OrderedDict())
+    monkeypatch.setattr(flights_module, "RESULT_CACHE_MAXSIZE", 2)
+
+    # Hit
+    assert flights_module.search_flights("ARN", "LHR", "2026-11-01") == "result 1"
+    assert flights_module.search_flights("arn", "lhr", "2026-11-01") == "result 1"
+    assert len(calls) == 1
+
+    # force-fallback bypasses the cache
+    flights_module.search_flights("ARN", "LHR", "2026-11-01", fetch_mode="force-fallback")
+    assert len(calls) == 2
+
+    # Eviction: the least recently used search is dropped past the max size
+    flights_module.search_flights("ARN", "CPH", "2026-11-01")
+    flights_module.search_flights("ARN", "OSL", "2026-11-01")
+    assert len(calls) == 4
+    flights_module.search_flights("ARN", "LHR", "2026-11-01")
+    assert len(calls) == 5
+
+    # Failures are not cached
+    for _ in range(2):
+        with pytest.raises(flights_module.FlightSearchError):
+            flights_module.search_flights("BAD", "LHR", "2026-11-01")
+    assert len(calls) == 7
+
+    # Expiry
+    monkeypatch.setattr(flights_module, "RESULT_CACHE_TTL", 0)
+    flights_module.search_flights("ARN", "LHR", "2026-11-01")
+    assert len(calls) == 8
+
+
+def test_ai_client_pool_closes_evicted_clients(monkeypatch):
+    """Test per-key AI clients are bounded and evicted ones are closed, the rest on shutdown."""
+    monkeypatch.setattr(api_module, "_AI_CLIENT_CLOSE_DELAY", 0)
+    closed = []
+
+    async def close(client):
+        closed.append(client)
+
+    async def run():
+        pool = api_module._ClientPool(2, lambda api_key: f"client-{api_key}", close)
+        assert pool.get("a") is pool.get("a")
+        pool.get("b")
+        pool.get("a")
+        pool.get("c")  # evicts b, the least recently used
+        await asyncio.sleep(0.01)
+        assert closed == ["client-b"]
+        await pool.aclose()
+
+    asyncio.run(run())
+    assert sorted(closed) == ["client-a", "client-b", "client-c"]
+
+
+def test_google_calls_use_their_own_api_key(monkeypatch):
+    """Test concurrent Gemini calls with different keys never share a client."""
+    class FakeGenerativeServiceClient:
+        def __init__(self, client_options):
+            self.api_key = client_options["api_key"]
+
+        def generate_content(self, request):
+            time.sleep(0.05)
+            prompt = request["contents"][0]["parts"][0]["text"]
+            text = f'{{"api_key": "{self.api_key}", "prompt": "{prompt}"}}'
+            part = SimpleNamespace(text=text)
+            return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    fake_glm = SimpleNamespace(
+        GenerativeServiceClient=FakeGenerativeServiceClient,
+        GenerateContentRequest=dict, Content=dict, Part=dict, GenerationConfig=dict
+    )
+    monkeypatch.setattr(api_module, "_load_generativelanguage", lambda: fake_glm)
+    monkeypatch.setattr(api_module, "_google_clients", api_module._ClientPool(
+        8, api_module._create_google_client, api_module._close_google_client
+    ))
+
+    async def run():
+        return await asyncio.gather(*(
+            api_module.call_ai_provider("google", f"query for {key}", key)
+            for key in ("key-a", "key-b", "key-a", "key-b")
+        ))
+
+    for reply in asyncio.run(run()):
+        response = json.loads(reply)
+        assert response["prompt"] == f"query for {response['api_key']}"
+
+
+def test_flights_search_with_url_builds_one_filter(monkeypatch):
+    """Test the search result and its Google Flights URL come from a single filter."""
+    built = []
+
+    class FakeFilter:
+        def as_b64(self):
+            return b"ZmlsdGVy"
+
+    def fake_build_filter(*args):
+        built.append(FakeFilter())
+        return built[-1]
+
+    monkeypatch.setattr(flights_module, "_build_filter", fake_build_filter)
+    monkeypatch.setattr(flights_module, "get_flights_from_filter", lambda flight_filter, mode: flight_filter)
+    monkeypatch.setattr(flights_module, "_result_cache", OrderedDict())
+
+    result, url = flights_module.search_flights_with_url("ARN", "LHR", "2026-11-01", return_date="2026-11-08")
+    assert len(built) == 1
+    assert result is built[0]
+    assert url == "https://www.google.com/travel/flights?tfs=ZmlsdGVy"
+
+
+def test_init_db_drops_retired_alert_index():
+    """Test init_db removes the superseded price alert index from existing databases."""
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_price_alerts_status_deleted_at ON price_alerts (status, deleted_at)"))
+
+    init_db()
+    index_names = {index["name"] for index in inspect(engine).get_indexes("price_alerts")}
+    assert "ix_price_alerts_status_deleted_at" not in index_names
+    assert "ix_price_alerts_active_created_at" in index_names
+
+
+def test_format_flights_defaults_missing_fields():
+    """Test flight objects missing optional fields are formatted with defaults."""
+    complete = SimpleNamespace(name="SAS", departure="08:00", arrival="10:00", duration="2 hr",
+                               stops=0, price="SEK 900", delay="15 min")
+    partial = SimpleNamespace(name="Norwegian", price="SEK 700")
+    formatted = format_flights([complete, partial])
+    assert formatted[0]["delay"] == "15 min"
+    assert formatted[1] == {
+        "name": "Norwegian", "departure": "", "arrival": "", "duration": "",
+        "stops": 0, "price": "SEK 700", "delay": None
+    }
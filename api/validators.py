@@ -4,16 +4,27 @@ Input validation utilities for API endpoints.
 
 import re
 from datetime import date, datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from api.constants import CITY_TO_AIRPORT
 from api.logger import logger
 
+# Compiled once; these run several times per search request
+_PAREN_AIRPORT_CODE_RE = re.compile(r'\(([A-Z]{3})\)')
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
+
+def _is_airport_code(code: str) -> bool:
+    """Exactly three ASCII letters (plain string checks, no regex)."""
+    return len(code) == 3 and code.isascii() and code.isalpha()
+
+
+@lru_cache(maxsize=4096)
 def validate_airport_code(code: str) -> bool:
     """Validate airport code format (3 uppercase letters)."""
     if not code:
         return False
-    return bool(re.match(r'^[A-Z]{3}$', code.upper()))
+    return _is_airport_code(code)
 
 
 def validate_date_not_past(test_date: date, field_name: str = "date") -> None:
@@ -39,8 +50,7 @@ def validate_email(email: str) -> bool:
     """Validate email format."""
     if not email:
         return False
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    return bool(_EMAIL_RE.match(email))
 
 
 def validate_origin_destination(origin: str, destination: str) -> None:
@@ -83,6 +93,7 @@ def validate_passenger_counts(adults: int, children: int, infants_seat: int, inf
         raise ValueError("Total passengers cannot exceed 9")
 
 
+@lru_cache(maxsize=4096)
 def sanitize_airport_code(code: str) -> str:
     """Sanitize and normalize airport code input."""
     if not code:
@@ -92,12 +103,12 @@ def sanitize_airport_code(code: str) -> str:
     code = code.strip().upper()
     
     # Extract airport code from strings like "London (LHR)" -> "LHR"
-    match = re.search(r'\(([A-Z]{3})\)', code)
+    match = _PAREN_AIRPORT_CODE_RE.search(code)
     if match:
         return match.group(1)
     
     # If it's already 3 uppercase letters, return as-is
-    if re.match(r'^[A-Z]{3}$', code):
+    if _is_airport_code(code):
         return code
     
     # Otherwise return uppercase (might be invalid, but let validation catch it)